@@ -28,40 +28,18 @@ class AG_engine(estimate_engine.estimate_engine):
     
     
     @staticmethod
-    def GenerateCells(x,n,m,num1,num2,grid):
-        # this function used to generate cells and compute their counts given the size
-        cells = []
-        counts = []
-        for i in range(num1):
-            for j in range(num2):
-                lb = [i*grid,j*grid]
-                rb = [(i+1)*grid-1,(j+1)*grid-1]
-                if rb[0] >= n:
-                    rb[0] = n-1
-                if rb[1] >= m:
-                    rb[1] = m-1
-                
-                cells = cells + [[lb,rb]]
-                
-                cnt = 0;
-                for k in range(lb[0],rb[0]+1):
-                    cnt = cnt + sum(x[k][lb[1]:rb[1]+1])
-                counts = counts + [cnt]
-        
-        return cells,counts
-
-    @staticmethod
-    def CountPerturb(x,cells,counts,epsilon,alpha,c2,prng):
+    def CountPerturb(x,rows,cols,counts,epsilon,alpha,c2,prng):
         # generate second level grids and compute the noisy counts
         n,m = x.shape
-        y = numpy.ndarray((n,m),'float32')
-        y.fill(0)
+        y = numpy.zeros((n,m),'float32')
+        sat = util.summed_area_table(x.astype('float32'))
         
-        noisycnt = counts + prng.laplace(0,util.old_div(1.0,(alpha * epsilon)),len(counts))
+        noisycnt = counts.ravel() + prng.laplace(0,util.old_div(1.0,(alpha * epsilon)),counts.size)
+        cells = [(lb0, rb0, lb1, rb1) for (lb0, rb0) in zip(*rows) for (lb1, rb1) in zip(*cols)]
         
         #second level grids and compute noisy counts with postprocessings
         for k in range(len(cells)):
-            x1,y1,x2,y2 = cells[k][0][0],cells[k][0][1],cells[k][1][0],cells[k][1][1]
+            x1,x2,y1,y2 = cells[k]
             nn = x2-x1+1
             mm = y2-y1+1
             
@@ -75,26 +53,21 @@ class AG_engine(estimate_engine.estimate_engine):
             newgrid = int(math.sqrt(nn*mm*1.0/M2)-1) + 1
             if newgrid <= 0:
                 newgrid = 1;
-            num1 = int(util.old_div((nn-1), newgrid) + 1)
-            num2 = int(util.old_div((mm-1), newgrid) + 1)
+            newrows = util.grid_bounds(nn, newgrid)
+            newcols = util.grid_bounds(mm, newgrid)
             
-            curX = numpy.ndarray((nn,mm),'float32')
-            for xx in range(x1,x2+1):
-                curX[xx-x1] = x[xx][y1:y2+1]
-            
-            newcells,newcounts = AG_engine.GenerateCells(curX,nn,mm,num1,num2,newgrid)
-            ncounts = newcounts + prng.laplace(0,util.old_div(1.0,((1-alpha)*epsilon)),len(newcounts))
+            newcounts = util.grid_counts(sat, newrows, newcols, (x1, y1))
+            ncounts = newcounts.ravel() + prng.laplace(0,util.old_div(1.0,((1-alpha)*epsilon)),newcounts.size)
+            total = numpy.cumsum(ncounts)[-1]   # summed in order, as sum() would
             
             #postprocessing
-            newncnt = (alpha*m2)**2 / ((1-alpha)**2 + (alpha*m2)**2) * noisycnt[k] + (1-alpha)**2 / ((1-alpha)**2 + (alpha*m2)**2) * sum(ncounts)
+            newncnt = (alpha*m2)**2 / ((1-alpha)**2 + (alpha*m2)**2) * noisycnt[k] + (1-alpha)**2 / ((1-alpha)**2 + (alpha*m2)**2) * total
+            
+            upcnt = ncounts + 1.0/ncounts.size * (newncnt - total)
+            areas = numpy.outer(newrows[1] - newrows[0] + 1, newcols[1] - newcols[0] + 1).ravel()
+            upavg = upcnt*1.0 / areas
             
-            for i in range(len(newcells)):
-                upcnt = ncounts[i] + 1.0/len(newcells) * (newncnt - sum(ncounts))
-                xx1,yy1,xx2,yy2 = x1 + newcells[i][0][0], y1 + newcells[i][0][1], x1 + newcells[i][1][0], y1 + newcells[i][1][1]
-                upavg = upcnt*1.0 / ((xx2-xx1+1)*(yy2-yy1+1))
-                
-                for j in range(xx1,xx2+1):
-                    y[j][yy1:yy2+1] = upavg
+            y[x1:x2+1, y1:y2+1] = util.fill_grid(upavg.reshape(newcounts.shape), newrows, newcols)
 
         return y
 
@@ -117,12 +90,11 @@ class AG_engine(estimate_engine.estimate_engine):
         if grid <= 0:
             grid = 1;
         
-        num1 = int(util.old_div((n-1), grid) + 1)
-        num2 = int(util.old_div((m-1), grid) + 1)
-        
-        cells,counts = AG_engine.GenerateCells(x,n,m,num1,num2,grid)
+        rows = util.grid_bounds(n, grid)
+        cols = util.grid_bounds(m, grid)
+        counts = util.grid_counts(util.summed_area_table(x), rows, cols)
         
-        y = AG_engine.CountPerturb(x,cells,counts,epsilon,self.alpha,self.c2,prng)
+        y = AG_engine.CountPerturb(x,rows,cols,counts,epsilon,self.alpha,self.c2,prng)
         
         return y
 
@@ -1,6 +1,5 @@
 from __future__ import division
 from __future__ import absolute_import
-from builtins import range
 import numpy
 from . import estimate_engine
 from . import UG
@@ -25,100 +24,66 @@ class DPcube_engine(estimate_engine.estimate_engine):
     
     @staticmethod
     def bucketcost(X,l1,l2):
-        # this function used to compute the intermediate costs of buckets
-        
-        p = []
-        pp = []
-        for i in range(l1+1):
-            if i == 0:
-                p = p + [numpy.zeros(l2+1)]
-                pp = pp + [numpy.zeros(l2+1)]
-                continue
-            
-            x1 = numpy.zeros(l2+1)
-            x2 = numpy.zeros(l2+1)
-            for j in range(l2):
-                x1[j+1] = x1[j] + X[i-1][j]
-                x2[j+1] = x2[j] + X[i-1][j]**2
-            
-            p = p + [x1]
-            pp = pp + [x2]
-        
-        for i in range(l1):
-            for j in range(l2+1):
-                p[i+1][j] = p[i][j] + p[i+1][j]
-                pp[i+1][j] = pp[i][j] + pp[i+1][j]
-        
+        # prefix sums of X and of X**2, with a leading row and column of zeros
+        X = numpy.asarray(X)[:l1,:l2]
+        p = numpy.zeros((l1+1,l2+1))
+        pp = numpy.zeros((l1+1,l2+1))
+        p[1:,1:] = numpy.cumsum(X, axis=1, dtype=float).cumsum(axis=0)
+        pp[1:,1:] = numpy.cumsum(X**2, axis=1, dtype=float).cumsum(axis=0)
         return p,pp
 
 
     @staticmethod
     def Compute(p,pp,x0,y0,x1,y1):
-        #this function used to compute the cost of bucket (x0,y0,x1,y1)
-        a1 = pp[x1+1][y1+1] + pp[x0][y0] - pp[x0][y1+1] - pp[x1+1][y0]
-        a2 = p[x1+1][y1+1] + p[x0][y0] - p[x0][y1+1] - p[x1+1][y0]
+        #this function used to compute the cost of bucket (x0,y0,x1,y1); any of the bounds may be arrays
+        a1 = pp[x1+1,y1+1] + pp[x0,y0] - pp[x0,y1+1] - pp[x1+1,y0]
+        a2 = p[x1+1,y1+1] + p[x0,y0] - p[x0,y1+1] - p[x1+1,y0]
         
         return a1 - a2**2 * 1.0 / ((x1-x0+1)*(y1-y0+1))
-    
+
     @staticmethod
-    def dpcube(epsilon,p,pp,rp,X2,start,end,prng):
-        # this function used to compute the noisy counts
+    def split(epsilon,p,pp,start,end):
+        # the best split of bucket (start,end) across its longer side, as the (end, start) of the two halves, or None
         (x0,y0) = start
         (x1,y1) = end
+        cur = DPcube_engine.Compute(p,pp,x0,y0,x1,y1) + util.old_div(1.0,epsilon)
         
-        len0 = x1 - x0 + 1
-        len1 = y1 - y0 + 1
+        if x1 - x0 > y1 - y0:
+            k = numpy.arange(x0,x1)
+            costs = DPcube_engine.Compute(p,pp,x0,y0,k,y1) + DPcube_engine.Compute(p,pp,k+1,y0,x1,y1)
+        else:
+            k = numpy.arange(y0,y1)
+            costs = DPcube_engine.Compute(p,pp,x0,y0,x1,k) + DPcube_engine.Compute(p,pp,x0,k+1,x1,y1)
+        if len(k) == 0:
+            return None
+        costs += util.old_div(2.0,epsilon)
         
-        if len0 > len1:
-            bias = DPcube_engine.Compute(p,pp,x0,y0,x1,y1)
-            cur = bias + util.old_div(1.0,epsilon)
-            flag = False
-            pos = x0
+        best = numpy.argmin(costs)
+        if not costs[best] < cur:
+            return None
+        pos = k[best]
+        if x1 - x0 > y1 - y0:
+            return (pos,y1),(pos+1,y0)
+        return (x1,pos),(x0,pos+1)
+    
+    @staticmethod
+    def dpcube(epsilon,p,pp,rp,X2,start,end,prng):
+        # this function used to compute the noisy counts; buckets are split depth first, left half first
+        stack = [(start,end)]
+        while stack:
+            (start,end) = stack.pop()
+            halves = DPcube_engine.split(epsilon,p,pp,start,end)
+            if halves is not None:
+                (mid1,mid2) = halves
+                stack.append((mid2,end))
+                stack.append((start,mid1))
+                continue
             
-            for k in range(x0,x1):
-                bias1 = DPcube_engine.Compute(p,pp,x0,y0,k,y1)
-                bias2 = DPcube_engine.Compute(p,pp,k+1,y0,x1,y1)
-                
-                if bias1 + bias2 + util.old_div(2.0, epsilon) < cur:
-                    cur = bias1 + bias2 + util.old_div(2.0,epsilon)
-                    flag = True
-                    pos = k
-        
-            if flag == True:
-                DPcube_engine.dpcube(epsilon,p,pp,rp,X2,(x0,y0),(pos,y1),prng)
-                DPcube_engine.dpcube(epsilon,p,pp,rp,X2,(pos+1,y0),(x1,y1),prng)
-            else:
-                ncnt = rp[x1+1][y1+1] + rp[x0][y0] - rp[x0][y1+1] - rp[x1+1][y0] + prng.laplace(0.0,util.old_div(1.0,epsilon))
-                navg = ncnt * 1.0 / (len0*len1)
-                
-                for i in range(x0,x1+1):
-                    X2[i][y0:y1+1] = navg
-                    
-        else:
-            bias = DPcube_engine.Compute(p,pp,x0,y0,x1,y1)
-            cur = bias + util.old_div(1.0,epsilon)
-            flag = False
-            pos = y0
-                    
-            for k in range(y0,y1):
-                bias1 = DPcube_engine.Compute(p,pp,x0,y0,x1,k)
-                bias2 = DPcube_engine.Compute(p,pp,x0,k+1,x1,y1)
-                                
-                if bias1 + bias2 + util.old_div(2.0,epsilon) < cur:
-                    cur = bias1 + bias2 + util.old_div(2.0,epsilon)
-                    flag = True
-                    pos = k
-                                                
-            if flag == True:
-                DPcube_engine.dpcube(epsilon,p,pp,rp,X2,(x0,y0),(x1,pos),prng)
-                DPcube_engine.dpcube(epsilon,p,pp,rp,X2,(x0,pos+1),(x1,y1),prng)
-            else:
-                ncnt = rp[x1+1][y1+1] + rp[x0][y0] - rp[x0][y1+1] - rp[x1+1][y0] + prng.laplace(0.0,util.old_div(1.0,epsilon))
-                navg = ncnt * 1.0 / (len0*len1)
-                                                                        
-                for i in range(x0,x1+1):
-                    X2[i][y0:y1+1] = navg
-                    
+            (x0,y0) = start
+            (x1,y1) = end
+            ncnt = rp[x1+1,y1+1] + rp[x0,y0] - rp[x0,y1+1] - rp[x1+1,y0] + prng.laplace(0.0,util.old_div(1.0,epsilon))
+            navg = ncnt * 1.0 / ((x1-x0+1)*(y1-y0+1))
+            X2[x0:x1+1,y0:y1+1] = navg
 
 
     def Run(self,Q,x,epsilon,seed):
@@ -1,7 +1,5 @@
 from __future__ import division
 from __future__ import absolute_import
-from builtins import range
-import math
 import numpy
 from . import estimate_engine
 from . import UG
@@ -28,71 +26,57 @@ class DPcube1D_engine(estimate_engine.estimate_engine):
     
     @staticmethod
     def bucketcost(X,l):
-        # this function used to compute the intermediate costs of buckets
-        
+        # prefix sums of X and of X**2, with a leading zero
+        X = numpy.asarray(X)[:l]
         p = numpy.zeros(l+1)
         pp = numpy.zeros(l+1)
-        for i in range(l):
-            p[i+1] = p[i] + X[i]
-            pp[i+1] = pp[i] + X[i]**2           
-
+        p[1:] = numpy.cumsum(X, dtype=float)
+        pp[1:] = numpy.cumsum(X**2, dtype=float)
         return p,pp
 
 
     @staticmethod
     def Compute(p,pp,left,right):
-        #this function used to compute the cost of bucket (left,right)
+        #this function used to compute the cost of bucket (left,right); left or right may be arrays
         a1 = pp[right+1] - pp[left]
         a2 = p[right+1] - p[left]
         
         return a1 - a2**2 * 1.0 / (right - left + 1)
+
+    @staticmethod
+    def split(epsilon,p,pp,left,right):
+        # the position after which to split bucket (left,right), or None
+        cur = DPcube1D_engine.Compute(p,pp,left,right) + util.old_div(1.0,epsilon)
+        k = numpy.arange(left,right)
+        if len(k) == 0:
+            return None
+        costs = DPcube1D_engine.Compute(p,pp,left,k) + DPcube1D_engine.Compute(p,pp,k+1,right) + util.old_div(2.0,epsilon)
+        best = numpy.argmin(costs)
+        return k[best] if costs[best] < cur else None
     
     @staticmethod
     def dpcube(epsilon,p,pp,rp,X2,left,right,prng):
-        # this function used to compute the noisy counts
-       
-        len = right - left + 1 
-        bias = DPcube1D_engine.Compute(p,pp,left,right)
-        cur = bias + util.old_div(1.0,epsilon)
-        flag = False
-        pos = left
+        # this function used to compute the noisy counts; buckets are split depth first, left half first
+        stack = [(left,right)]
+        while stack:
+            (left,right) = stack.pop()
+            pos = DPcube1D_engine.split(epsilon,p,pp,left,right)
+            if pos is not None:
+                stack.append((pos+1,right))
+                stack.append((left,pos))
+                continue
             
-        for k in range(left,right):
-            bias1 = DPcube1D_engine.Compute(p,pp,left,k)
-            bias2 = DPcube1D_engine.Compute(p,pp,k+1,right)
-            if bias1 + bias2 + util.old_div(2.0, epsilon) < cur:
-                cur = bias1 + bias2 + util.old_div(2.0,epsilon)
-                flag = True
-                pos = k
-        
-        if flag == True:
-            DPcube1D_engine.dpcube(epsilon,p,pp,rp,X2,left,pos,prng)
-            DPcube1D_engine.dpcube(epsilon,p,pp,rp,X2,pos+1,right,prng)
-        else:
             ncnt = rp[right+1] - rp[left] + prng.laplace(0.0,util.old_div(1.0,epsilon))
-            navg = ncnt * 1.0 / len
-                
-            for i in range(left,right+1):
-                X2[i] = navg
+            X2[left:right+1] = ncnt * 1.0 / (right - left + 1)
                     
     @staticmethod                
     def GetsynData(x,gz,epsilon,prng):
+        # noisy counts of consecutive blocks of gz cells (the last one may be shorter), spread uniformly
         l = len(x)
-        y = numpy.zeros(l)
-        
-        p = util.old_div(l,gz)
-        for i in range(p):
-            nc = sum(x[i*gz:(i+1)*gz]) 
-            nc = nc + prng.laplace(0.0,util.old_div(1.0,epsilon))
-            for j in range(gz):
-                y[i*gz+j] = nc*1.0/gz   
-
-        if l % gz != 0:
-            nc = sum(x[p*gz:])
-            nc = nc + prng.laplace(0.0,util.old_div(1.0,epsilon))
-            for j in range(l - p*gz):
-                y[p*gz+j] = nc*1.0/(l-p*gz) 
-        return y
+        starts = numpy.arange(0, l, gz)
+        sizes = numpy.diff(numpy.append(starts, l))
+        nc = numpy.add.reduceat(x, starts) + prng.laplace(0.0,util.old_div(1.0,epsilon),len(starts))
+        return numpy.repeat(nc*1.0/sizes, sizes)
 
     def Run(self,Q,x,epsilon,seed):
 
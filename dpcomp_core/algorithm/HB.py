@@ -35,6 +35,14 @@ class HB_engine(estimate_engine.estimate_engine):
         b = find_best_branching(N)
         return np.array(build_tree(x, epsilon,prng, b))
 
+    def RunBatch(self, Q, x, epsilon, seeds):
+        prngs = estimate_engine.BatchRandomState(seeds)
+
+        assert len(x.shape)==1, '%s is defined for 1D data only' % self.__class__.__name__
+
+        b = find_best_branching(len(x))
+        return np.array(build_tree(x, epsilon, prngs, b))
+
 '''
 Canonical name:     H (1D)
 Additional aliases: Hierarchical
@@ -60,6 +68,11 @@ class H2_engine(estimate_engine.estimate_engine):
 
         return np.array(build_tree(x, epsilon,prng))
 
+    def RunBatch(self, Q, x, epsilon, seeds):
+        prngs = estimate_engine.BatchRandomState(seeds)
+
+        return np.array(build_tree(x, epsilon, prngs))
+
 
 '''
 Technique from Qardaji et al. PVLDB 2013.
@@ -67,17 +80,38 @@ Technique from Qardaji et al. PVLDB 2013.
 
 def find_best_branching(N):
     '''
-    Try all branchings from 2 to N and pick one 
-    with minimum variance.
+    Pick the branching from 2 to N with minimum variance.
     '''
-    min_v = float('inf')
-    min_b = None
-    for b in range(2,N+1):
-        v = variance(N, b)
-        if v < min_v:
-            min_v = v
-            min_b = b
-    return min_b
+    return search_branching(N, N, variance)
+
+# memoized results of search_branching, keyed by (variance function, N, n)
+_branching_cache = {}
+
+def search_branching(N, n, variance):
+    '''
+    Return the smallest b in [2, n] minimizing variance(N, b), for variance functions that depend on b
+    only through b and the tree height ceil(log(n, b)), and grow with b for a fixed height.
+    The minimum is then attained where the height changes, so only b close to ceil(n**(1/h)) is
+    tried for each height h (a neighbour on either side guards against rounding in math.log).
+    '''
+    key = (variance, N, n)
+    if key not in _branching_cache:
+        candidates = set()
+        if n >= 2:
+            for h in range(1, int(math.ceil(math.log(n, 2))) + 2):
+                b = int(math.ceil(n ** (1.0 / h)))
+                candidates.update(range(max(b - 1, 2), min(b + 1, n) + 1))
+
+        min_v = float('inf')
+        min_b = None
+        for b in sorted(candidates):
+            v = variance(N, b)
+            if v < min_v:
+                min_v = v
+                min_b = b
+        _branching_cache[key] = min_b
+
+    return _branching_cache[key]
 
 def variance(N, b):
     '''Computes variance given domain of size N 
@@ -86,6 +120,7 @@ def variance(N, b):
     return ( ((b - 1) * h**3) - (util.old_div((2 * (b+1) * h**2), 3)))
 
 def build_tree(x, epsilon,prng, b=2):
+    '''prng may be an estimate_engine.BatchRandomState, giving one estimate per row'''
 
     # tree code requires len(x) be a power of b
     # if it is not, then pad x with 0s and then remove at end
@@ -93,15 +128,15 @@ def build_tree(x, epsilon,prng, b=2):
     target_n = b**int(math.ceil(math.log(n, b)))
     if n < target_n:
         x = np.append(x, [0]*(target_n - n))
-    H = h_tree.HTree(b, x)
+    H = h_tree.LevelTree(b, x)
 
-    # add noise
+    # add noise, drawn in postorder for all nodes at once
     epsilon = util.old_div(float(epsilon), H.height)  # uniform allocation
-    for node in H.postorder_iter():
-        node.noisy = node.count + prng.laplace(0, util.old_div(1,epsilon))
-    
-    est_x = H.inference()
-    return est_x[:n]  # truncate any padded zeros
+    noise = H.from_postorder(prng.laplace(0, util.old_div(1,epsilon), H.size))
+    noisy = [count + level_noise for (count, level_noise) in zip(H.counts, noise)]
+
+    est_x = H.inference(noisy)
+    return est_x[..., :n]  # truncate any padded zeros
 
 
 
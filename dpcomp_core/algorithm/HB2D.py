@@ -4,6 +4,8 @@ from builtins import range
 from past.utils import old_div
 from builtins import object
 from . import estimate_engine
+from . import h_tree
+from .HB import search_branching
 import math
 import numpy
 from dpcomp_core import util
@@ -44,58 +46,28 @@ class HB2D_engine(estimate_engine.estimate_engine):
         height = math.ceil(math.log(int(math.sqrt(l1*l2)),b))
         
         l = int(b ** height);
-        newx = numpy.ndarray((l,l),'float32')
-        newx.fill(0)
-        for i in range(l1):
-            newx[i][:l2] = x[i]
+        newx = numpy.zeros((l,l),'float32')
+        newx[:l1, :l2] = x
 
-        
-        acc = {}
-        for i in range(l):
-            acc[i] = {}
-            acc[i][-1] = 0
-            for j in range(l):
-                acc[i][j] = acc[i][j-1] + newx[i][j]
+        H = h_tree.LevelTree(b, newx.astype(float), ndim=2)
 
-        Root = HNode((0,0),(l-1,l-1),None,height)
-        BuildTree(Root,acc,newx,(0,0),(l-1,l-1),b,epsilon*1.0/height,height,height,prng)
+        # noise for every node but the root, drawn in postorder (the root comes last)
+        noise = numpy.append(prng.laplace(0.0, old_div(1.0, epsilon*1.0/height), H.size - 1), 0)
+        noisy = [count + e for (count, e) in zip(H.counts, H.from_postorder(noise))]
 
-        WeightAvg(Root,b)
-        for ch in Root.children:
-            MeanConst(newx,ch,b,0,height)
+        # the root has no noisy count, so postprocessing starts at its children
+        br = b**2
+        alpha = [(br**(h+1) - br**h) *1.0/ (br**(h+1) - 1) for h in range(int(height), -1, -1)]
+        counts = H.weighted_average(noisy, alpha, top=1)
+        newx = H.mean_consistency(counts, top=1)
 
-        outputx = numpy.ndarray((l1,l2),'float32')
-        for i in range(l1):
-            outputx[i] = newx[i][:l2]
+        outputx = numpy.array(newx[:l1, :l2], 'float32')
         return outputx
 
 
-
-class HNode(object):
-    def __init__(self,start,end,count,height):
-        self.start = start
-        self.end = end
-        self.count = count
-        self.height = height
-        self.children = []
-        self.parent = None
-
-    def isleaf(self):
-        return len(self.children) == 0
-
-
 def find_best_branching(N):
-    '''Try all branchings from 2 to sqrt(N) and pick onewith minimum variance.'''
-    min_v = float('inf')
-    min_b = None
-    n = int(math.sqrt(N))
-
-    for b in range(2,n+1):
-        v = variance(N, b)
-        if v < min_v:
-            min_v = v
-            min_b = b
-    return min_b
+    '''Pick the branching from 2 to sqrt(N) with minimum variance.'''
+    return search_branching(N, int(math.sqrt(N)), variance)
 
 def variance(N, b):
     '''Computes variance given domain of size N and branchng factor b.  Equation in section 5.1.'''
@@ -103,105 +75,3 @@ def variance(N, b):
     h = math.ceil(math.log(n,b))
 
     return b * (n-1) * h**2
-
-def BuildTree(Node,acc,X,start,end,b,epsilon,height,toth,prng):
-    ''' Build the tree on X based on branching b and compute noisy count'''
-    if height == 0:
-        nv = X[start[0]][start[1]] + prng.laplace(0.0,old_div(1.0,epsilon))
-        Node.count = nv
-
-    else:
-        gridx = [int(old_div((end[0] - start[0] + 1),b))]*b
-        left = end[0] - start[0] + 1 - sum(gridx)
-        for i in range(left):
-            gridx[i] = gridx[i] + 1
-
-        gridy = [int(old_div((end[1] - start[1] + 1),b))]*b
-        left = end[1] - start[1] + 1 - sum(gridy)
-        for i in range(left):
-            gridy[i] = gridy[i] + 1
-            
-        newgridx = []
-        newgridy = []
-        for x in gridx:
-            if x != 0:
-                newgridx = newgridx + [x]
-        for y in gridy:
-            if y != 0:
-                newgridy = newgridy + [y]
-                
-        for i in range(len(newgridx)-1):
-            newgridx[i+1] = newgridx[i+1] + newgridx[i]
-        for i in range(len(newgridy)-1):
-            newgridy[i+1] = newgridy[i+1] + newgridy[i]
-                
-        newgridy = [0] + newgridy
-        newgridx = [0] + newgridx
-
-        for i in range(len(newgridx)-1):
-            for j in range(len(newgridy)-1):
-                x0,y0 = start[0] + newgridx[i], start[1] + newgridy[j]
-                x1,y1 = start[0] + newgridx[i+1] - 1, start[1] + newgridy[j+1] - 1
-                
-                newN = HNode((x0,y0),(x1,y1),None,height-1)
-                newN.parent = Node
-                Node.children = Node.children + [newN]
-                            
-                BuildTree(newN,acc,X,(x0,y0),(x1,y1),b,epsilon,height - 1,toth,prng)
-            
-        if height < toth:
-            tot = 0;
-            for i in range(start[0],end[0]+1):
-                tot = tot + acc[i][end[1]] - acc[i][start[1]-1]
-                        
-            ntot = tot + prng.laplace(0.0, old_div(1.0,epsilon))
-            Node.count = ntot
-
-def WeightAvg(Node,b):
-    ''' First postprocessing: Weighted averaging (in section 3.3)'''
-    if Node.isleaf() == True:
-        return
-        
-    for ch in Node.children:
-        WeightAvg(ch,b)
-    
-    if Node.count != None:
-        br = b**2
-        alpha = (br**(Node.height+1) - br**(Node.height)) *1.0/ (br**(Node.height+1) - 1)
-        tot = 0
-        for x in Node.children:
-            tot = tot + x.count
-                
-        Node.count = alpha * Node.count + (1-alpha) * tot
-
-
-def MeanConst(X,Node,b,cursum,height):
-    ''' Second postprocessing: Mean consistency (in section 3.3)'''
-    if Node.height == height - 1:
-        if Node.isleaf():
-            X[Node.start[0]][Node.start[1]] = Node.count
-        else:
-            tot = 0
-            for ch in Node.children:
-                tot = tot + ch.count
-                    
-            for ch in Node.children:
-                MeanConst(X,ch,b,tot,height)
-    
-    else:
-        pn = Node.parent.count
-        Node.count = Node.count + 1.0 / (b**2) * (pn - cursum)
-
-        if Node.isleaf():
-            X[Node.start[0]][Node.start[1]] = Node.count
-        else:
-            tot = 0
-            for ch in Node.children:
-                tot = tot + ch.count
-                    
-            for ch in Node.children:
-                MeanConst(X,ch,b,tot,height)
-
-
-
-
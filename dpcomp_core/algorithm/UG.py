@@ -26,41 +26,15 @@ class UG_engine(estimate_engine.estimate_engine):
         self.short_name = short_name
     
     @staticmethod
-    def GenerateCells(n,m,num1,num2,grid):
-        # this function used to generate all the cells
-        cells = []
-        for i in range(num1):
-            for j in range(num2):
-                lb = [int(i*grid),int(j*grid)]
-                rb = [int((i+1)*grid-1),int((j+1)*grid-1)]
-                if rb[0] >= n:
-                    rb[0] = int(n-1)
-                if rb[1] >= m:
-                    rb[1] = int(m-1)
-                
-                cells = cells + [[lb,rb]]
-        
-        return cells
-
-    @staticmethod
-    def CountPerturb(x,cells,epsilon,prng):
+    def CountPerturb(x,rows,cols,epsilon,prng):
         # this function used to perturb counts based on generated grids
-        n,m = x.shape
-        y = numpy.ndarray((n,m),'float32')
-        y.fill(0)
-        
-        for cell in cells:
-            x1,y1,x2,y2 = int(cell[0][0]),int(cell[0][1]),int(cell[1][0]),int(cell[1][1])
-            cnt = 0
-            for i in range(x1,x2+1):
-                cnt = cnt + sum(x[i][y1:y2+1])
-        
-            navg = util.old_div((prng.laplace(cnt,util.old_div(1.0,epsilon))), ((x2-x1+1)*(y2-y1+1)))
-        
-            for i in range(x1,x2+1):
-                y[i][y1:y2+1] = navg
+        counts = util.grid_counts(util.summed_area_table(x), rows, cols)
+        areas = numpy.outer(rows[1] - rows[0] + 1, cols[1] - cols[0] + 1)
 
-        return y
+        # one noisy count per cell, in row-major cell order, spread uniformly over the cell
+        navg = prng.laplace(counts, util.old_div(1.0,epsilon)) / areas
+
+        return util.fill_grid(navg, rows, cols).astype('float32')
     
     def Run(self,Q,x,epsilon,seed):
         
@@ -83,12 +57,10 @@ class UG_engine(estimate_engine.estimate_engine):
         if grid < 1:
             grid = 1
         
-        num1 = int(util.old_div((n-1), grid) + 1)
-        num2 = int(util.old_div((m-1), grid) + 1)
-        
-        cells = UG_engine.GenerateCells(n,m,num1,num2,grid)
+        rows = util.grid_bounds(n, grid)
+        cols = util.grid_bounds(m, grid)
         
-        y = UG_engine.CountPerturb(x,cells,epsilon,prng)
+        y = UG_engine.CountPerturb(x,rows,cols,epsilon,prng)
         
         return y
 
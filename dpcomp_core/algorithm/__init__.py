@@ -3,6 +3,7 @@ from builtins import str
 from dpcomp_core.mixins import Marshallable
 from dpcomp_core import util
 import hashlib
+import numpy
 
 from . import AG
 from . import ahp
@@ -31,6 +32,11 @@ class BaseAlgorithm(Marshallable):
     def Run(self, Q, x, epsilon, seed=None):
         raise NotImplementedError()
 
+    def RunBatch(self, Q, x, epsilon, seeds):
+        """ One estimate per seed, stacked into a (trials x domain) array """
+        assert all(seed is not None for seed in seeds), 'seeds must be set'
+        return numpy.array([self.Run(Q, x, epsilon, seed) for seed in seeds])
+
     def asDict(self):
         d = util.class_to_dict(self)
         return d
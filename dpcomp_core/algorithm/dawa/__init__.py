@@ -6,6 +6,7 @@ from .partition_engines import l1partition
 from .routine_engines import routine_engine
 from dpcomp_core.mixins import Marshallable
 from dpcomp_core import util
+from dpcomp_core import workload
 from . import greedyH
 import numpy
 import math
@@ -54,6 +55,7 @@ class dawa2D_engine(routine_engine.transform_engine_qtqmatrix_linear, Marshallab
         self.init_params = util.init_params_from_locals(locals())
 
         self._ratio = ratio
+        self._max_block_size = None
         self._partition_engine = l1partition.l1partition_approx_engine()
         self._estimate_engine = greedyH.greedyH_engine()
         self.short_name = short_name
@@ -63,7 +65,6 @@ class dawa2D_engine(routine_engine.transform_engine_qtqmatrix_linear, Marshallab
         assert seed is not None, 'seed must be set'
         assert len(x.shape)==2, '%s is defined for 2D data only' % self.__class__.__name__
         n1, n2 = x.shape
-        Q = list(Q.query_list)
 
         # STEP 1: apply hilbert curve to get 1D
         # ... first expand x to be square and a power of 2
@@ -77,13 +78,8 @@ class dawa2D_engine(routine_engine.transform_engine_qtqmatrix_linear, Marshallab
         x1d = x[xcoords, ycoords]      # index into x at these points to get 1d representation
 
         # STEP 2: similarly transform queries
-        m = len(Q)
-        Qmat = numpy.zeros([m, len(x1d)])  # workload matrix: m by n, for m queries over 1d domain of size n
-        for i in range(m):
-            query = Q[i]
-            query2d = query.asArray([d,d])    # query as d x d array
-            query1d = query2d[xcoords, ycoords]  # array transformed to 1d via hilbert transform
-            Qmat[i, :] = query1d  # embed this query into ith row of workload matrix
+        # ... each rectangle becomes a union of intervals along the hilbert curve
+        Qmat = hilbert_workload(Q, d)
 
         # STEP 3: call DAWA_LINEAR
         if self._ratio == 0:
@@ -100,6 +96,10 @@ class dawa2D_engine(routine_engine.transform_engine_qtqmatrix_linear, Marshallab
 
         return hatx2d
 
+    def RunBatch(self, Q, x, epsilon, seeds):
+        assert all(seed is not None for seed in seeds), 'seeds must be set'
+        return numpy.array([self.Run(Q, x, epsilon, seed) for seed in seeds])
+
 # running only with greedyH as estimate engine, no partition engine used
 '''
 Canonical name:     Greedy H (1D)
@@ -126,6 +126,9 @@ class greedyH_only_engine(routine_engine.transform_engine_qtqmatrix, Marshallabl
 
         return super(type(self),self).Run(Q, x, epsilon, seed)
 
+# memoized hilbert curves: side length -> (xcoords, ycoords, position)
+_hilbert_cache = {}
+
 def hilbert(N):
     """
     Produce coordinates of an NxN Hilbert curve.
@@ -138,14 +141,60 @@ def hilbert(N):
           of points along the Hilbert curve. Calling plot(x, y)
           will plot the Hilbert curve.
 
-    From Wikipedia
+    From Wikipedia. Curves are memoized, so the returned arrays are read-only.
+    """
+    if N not in _hilbert_cache:
+        assert 2**int(math.ceil(math.log(N, 2))) == N, "N={0} is not a power of 2!".format(N)
+        if N==2:
+            xl, yl = numpy.array((0, 0, 1, 1)), numpy.array((0, 1, 1, 0))
+        else:
+            x, y = hilbert(util.old_div(N,2))
+            xl = numpy.r_[y, x,     util.old_div(N,2)+x, N-1-y  ]
+            yl = numpy.r_[x, util.old_div(N,2)+y, util.old_div(N,2)+y, util.old_div(N,2)-1-x]
+        position = numpy.empty((N, N), dtype=int)
+        position[xl, yl] = numpy.arange(N*N)
+        for a in (xl, yl, position):
+            a.setflags(write=False)
+        _hilbert_cache[N] = (xl, yl, position)
+
+    return _hilbert_cache[N][:2]
+
+def hilbert_position(N):
+    """
+    Inverse of hilbert(N): the N x N array of the position of every cell along the curve.
+    """
+    hilbert(N)
+    return _hilbert_cache[N][2]
+
+def hilbert_intervals(N, lb, ub):
     """
-    assert 2**int(math.ceil(math.log(N, 2))) == N, "N={0} is not a power of 2!".format(N)
-    if N==2:
-        return  numpy.array((0, 0, 1, 1)), numpy.array((0, 1, 1, 0))
-    else:
-        x, y = hilbert(util.old_div(N,2))
-        xl = numpy.r_[y, x,     util.old_div(N,2)+x, N-1-y  ]
-        yl = numpy.r_[x, util.old_div(N,2)+y, util.old_div(N,2)+y, util.old_div(N,2)-1-x]
-        return xl, yl
+    The rectangle lb..ub (inclusive corners) of an NxN grid as a list of [start, end] intervals of
+    positions along the Hilbert curve.
 
+    Consecutive cells of the curve are neighbours, so an interval can only start or end at a cell
+    on the border of the rectangle: only those cells are looked at.
+    """
+    xl, yl = hilbert(N)
+    position = hilbert_position(N)
+    (r0, c0), (r1, c1) = lb, ub
+    border = numpy.unique(numpy.concatenate([position[r0, c0:c1+1], position[r1, c0:c1+1],
+                                             position[r0:r1+1, c0], position[r0:r1+1, c1]]))
+
+    def inside(p):
+        return (xl[p] >= r0) & (xl[p] <= r1) & (yl[p] >= c0) & (yl[p] <= c1)
+
+    starts = border[(border == 0) | ~inside(numpy.maximum(border-1, 0))]
+    ends = border[(border == N*N-1) | ~inside(numpy.minimum(border+1, N*N-1))]
+    return list(zip(starts, ends))
+
+def hilbert_workload(Q, N):
+    """
+    Project a 2D range workload Q over (a corner of) an NxN grid to a 1D workload over the
+    N*N positions of the Hilbert curve: every query becomes a union of intervals.
+    """
+    lb, ub, wgt, qid = Q.range_arrays()
+    ranges = [(start, end, w, q) for (l, u, w, q) in zip(lb, ub, wgt, qid)
+              for (start, end) in hilbert_intervals(N, l, u)]
+    columns = list(zip(*ranges)) or [[], [], [], []]   # no ranges at all
+    start, end, w, q = [numpy.array(a, dtype=t) for (a, t) in zip(columns, (int, int, float, int))]
+    return workload.Workload.from_ranges(start.reshape(-1, 1), end.reshape(-1, 1), (N*N,), w, q)
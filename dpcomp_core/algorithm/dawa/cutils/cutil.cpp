@@ -338,3 +338,26 @@ void L1partition(int *hist, int n1, double* x, int n, double epsilon, double rat
     delete []lbound;
 }
 ////////////////////////////////////////////////////////////////////////////
+
+////////////////////////////////////////////////////////////////////////////
+// Noisy L1 partitions of many vectors of the same length in one call.
+// Job i partitions row i of x with epsilon[i], ratio[i] and seed[i] and
+// writes its boundaries to row i of hist. Every job has its own random
+// number generator, so jobs run in parallel when compiled with OpenMP.
+// Returns -1 without running any job if the argument lengths disagree.
+int L1partition_batch(int *hist, int jobs, int n1, double* x, int xjobs, int n,
+                      double* epsilon, int neps, double* ratio, int nratio,
+                      long* seed, int nseed, int approx)    {
+    if ( xjobs != jobs || neps != jobs || nratio != jobs || nseed != jobs )
+        return -1;
+#ifdef _OPENMP
+    #pragma omp parallel for schedule(dynamic)
+#endif
+    for (int i=0; i<jobs; i++)  {
+        if ( approx )
+            L1partition_approx(hist + (long)i*n1, n1, x + (long)i*n, n, epsilon[i], ratio[i], seed[i]);
+        else
+            L1partition(hist + (long)i*n1, n1, x + (long)i*n, n, epsilon[i], ratio[i], seed[i]);
+    }
+    return 0;
+}
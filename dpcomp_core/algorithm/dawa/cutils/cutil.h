@@ -1,3 +1,5 @@
 void L1partition(int* hist, int n1, double* x, int n, double epsilon,  double ratio, long seed);
 void L1partition_approx(int* hist, int n1, double* x, int n, double epsilon,  double ratio, long seed);
-
+int L1partition_batch(int* hist, int jobs, int n1, double* x, int xjobs, int n,
+                      double* epsilon, int neps, double* ratio, int nratio,
+                      long* seed, int nseed, int approx);
@@ -1,4 +1,5 @@
-%module cutil
+// threads="1" releases the GIL around every kernel: they only touch C arrays
+%module(threads="1") cutil
 
 %{
 #define SWIG_FILE_WITH_INIT
@@ -12,6 +13,20 @@ import_array();
 
 %apply (double* IN_ARRAY1, int DIM1) {(double* x, int n)};
 %apply (int* ARGOUT_ARRAY1, int DIM1) {(int* hist, int n1)};
+%apply (int* INPLACE_ARRAY2, int DIM1, int DIM2) {(int* hist, int jobs, int n1)};
+%apply (double* IN_ARRAY2, int DIM1, int DIM2) {(double* x, int xjobs, int n)};
+%apply (double* IN_ARRAY1, int DIM1) {(double* epsilon, int neps), (double* ratio, int nratio)};
+%apply (long* IN_ARRAY1, int DIM1) {(long* seed, int nseed)};
+
+// the batch returns -1 when the lengths of its arguments disagree
+%exception L1partition_batch {
+    $action
+    if (result != 0) {
+        PyErr_SetString(PyExc_ValueError, "x, epsilon, ratio and seed must have one row per row of hist");
+        SWIG_fail;
+    }
+}
+%typemap(out) int L1partition_batch "$result = SWIG_Py_Void();";
 %include "cutil.h"
 
 %clear (double* x, int n);
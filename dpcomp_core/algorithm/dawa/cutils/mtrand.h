@@ -47,12 +47,12 @@
 
 class MTRand_int32 { // Mersenne Twister random number generator
 public:
-// default constructor: uses default seed only if this is the first instance
-  MTRand_int32() { if (!init) seed(5489UL); init = true; }
+// default constructor: uses the default seed
+  MTRand_int32() { seed(5489UL); }
 // constructor with 32 bit int as seed
-  MTRand_int32(unsigned long s) { seed(s); init = true; }
+  MTRand_int32(unsigned long s) { seed(s); }
 // constructor with array of size 32 bit ints as seed
-  MTRand_int32(const unsigned long* array, int size) { seed(array, size); init = true; }
+  MTRand_int32(const unsigned long* array, int size) { seed(array, size); }
 // the two seed functions
   void seed(unsigned long); // seed with 32 bit integer
   void seed(const unsigned long*, int size); // seed with array
@@ -64,10 +64,9 @@ protected: // used by derived classes, otherwise not accessible; use the ()-oper
   unsigned long rand_int32(); // generate 32 bit random integer
 private:
   static const int n = 624, m = 397; // compile time constants
-// the variables below are static (no duplicates can exist)
-  static unsigned long state[n]; // state vector array
-  static int p; // position in state array
-  static bool init; // true if init function is called
+// the state is kept per instance, so generators in different threads are independent
+  unsigned long state[n]; // state vector array
+  int p; // position in state array
 // private functions used to generate the pseudo random numbers
   unsigned long twiddle(unsigned long, unsigned long); // used by gen_state()
   void gen_state(); // generate new state
@@ -0,0 +1,201 @@
+"""NumPy implementation of the L1 partition kernels in cutil.cpp.
+
+It is used when the C extension has not been built. The functions take the
+same arguments as the SWIG wrappers and, given the same seed, return the
+same partitions: the random numbers come from the same Mersenne Twister
+stream (numpy's random_sample) and the scores are computed with the same
+floating point operations.
+
+The C code keeps each window in a treap to find the number and sum of the
+entries below the window average. Here the input is instead cut into dyadic
+blocks, each sorted once, and every window is answered at once as a union
+of O(log n) blocks with searchsorted.
+"""
+from __future__ import division
+from builtins import range
+from builtins import object
+import numpy
+
+# number of windows scored per vectorized pass
+_CHUNK = 1 << 20
+
+
+class _DyadicBlocks(object):
+    """Sorted dyadic blocks of an int vector, for counting and summing the
+    entries of x[lo:hi] that are at most t."""
+
+    def __init__(self, x):
+        x = numpy.asarray(x, dtype=numpy.int64)
+        n = len(x)
+        self.min = x.min()
+        self.width = x.max() - self.min + 1
+        self.levels = max(1, (n-1).bit_length()) + 1
+        padded = numpy.zeros(1 << (self.levels-1), dtype=numpy.int64)
+        padded[:n] = x - self.min
+
+        self.keys = []
+        self.sums = []
+        for b in range(self.levels):
+            blocks = numpy.sort(padded.reshape(-1, 1 << b), axis=1)
+            # blocks laid end to end stay sorted once shifted by their index
+            self.keys.append((blocks + numpy.arange(len(blocks))[:, None] * self.width).ravel())
+            self.sums.append(numpy.concatenate([[0], numpy.cumsum(blocks.ravel() + self.min)]))
+
+    def below(self, lo, hi, t):
+        """Count and sum of the entries of x[lo:hi] that are <= t."""
+        t = numpy.clip(t - self.min, -1, self.width - 1)
+        a = lo.copy()
+        count = numpy.zeros(len(a), dtype=numpy.int64)
+        total = numpy.zeros(len(a), dtype=numpy.int64)
+
+        def take(b, mask):
+            q = a[mask] >> b
+            start = q << b
+            pos = numpy.searchsorted(self.keys[b], q * self.width + t[mask], side='right')
+            count[mask] += pos - start
+            total[mask] += self.sums[b][pos] - self.sums[b][start]
+            a[mask] += 1 << b
+
+        # climb while a is not aligned, then descend to hi
+        for b in range(self.levels):
+            take(b, ((a >> b) & 1).astype(bool) & (a + (1 << b) <= hi))
+        for b in reversed(range(self.levels)):
+            take(b, a + (1 << b) <= hi)
+        return count, total
+
+
+def _deviation(blocks, prefix, lo, hi):
+    """L1 distance of every window x[lo:hi] from its own average, computed
+    like cutil.cpp does from the treap search."""
+    size = hi - lo
+    s = prefix[hi] - prefix[lo]
+    avg = s / size
+    lct, lsum = blocks.below(lo, hi, numpy.floor(avg).astype(numpy.int64))
+    rct, rsum = size - lct, s - lsum
+    return (lct - rct) * avg - lsum.astype(float) + rsum
+
+
+def _scores(x, lo, hi):
+    x = numpy.asarray(x).astype(numpy.int64)
+    blocks = _DyadicBlocks(x)
+    prefix = numpy.concatenate([[0], numpy.cumsum(x)])
+    out = numpy.empty(len(lo))
+    for c in range(0, len(lo), _CHUNK):
+        out[c:c+_CHUNK] = _deviation(blocks, prefix, lo[c:c+_CHUNK], hi[c:c+_CHUNK])
+    return out
+
+
+def _noisy(score, r, scale, invepsilon2, zero):
+    """Add invepsilon2 and Laplace noise (from the uniforms r) to score, with
+    no noise where zero is set, and clip from below at invepsilon2."""
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        lap = scale * numpy.sign(r) * numpy.log(1.0 - 2.0 * numpy.abs(r))
+    lap[zero] = 0
+    score += invepsilon2 + lap
+    return numpy.maximum(score, invepsilon2)
+
+
+def _bounds(lbound, n1):
+    hist = numpy.zeros(n1, dtype=numpy.intc)
+    j, i = len(lbound) - 1, 0
+    while i < n1 and j > -1:
+        hist[i] = j
+        j = lbound[j]
+        i += 1
+    return hist
+
+
+def L1partition_approx(n1, x, epsilon, ratio, seed):
+    """Noisy L1 partition with interval buckets of size 2^k."""
+    n = len(x)
+    invepsilon1 = 1.0 / (epsilon*ratio)
+    invepsilon2 = 1.0 / (epsilon - epsilon*ratio)
+    invn = 1.0 / n
+    rnum = numpy.random.RandomState(seed)
+
+    # score[off][k] is the score of the bucket of length 2^off ending at
+    # k + 2^off - 1, i.e. score[i][off] in cutil.cpp
+    lens = [1 << off for off in range(n.bit_length()) if (1 << off) <= n]
+    lo = numpy.concatenate([numpy.arange(n-l+1) for l in lens])
+    hi = numpy.concatenate([numpy.arange(l, n+1) for l in lens])
+    score = _scores(x, lo, hi)
+    r = 0.5 - rnum.random_sample(len(score))
+    size = hi - lo
+    scale = (2.0 - 1.0/size - invn) * invepsilon1
+    score = _noisy(score, r, scale, invepsilon2, size == 1)
+    ends = numpy.cumsum([0] + [n-l+1 for l in lens])
+    score = [score[ends[off]:ends[off+1]].tolist() for off in range(len(lens))]
+
+    cumscore = [0.0] * (n+1)
+    lbound = [-1] * (n+1)
+    level0 = score[0]
+    for i in range(n):
+        best = cumscore[i] + level0[i]
+        lb = i
+        for off in range(1, (i+1).bit_length()):
+            l = lens[off]
+            cur = cumscore[i-l+1] + score[off][i-l+1]
+            if cur <= best:
+                best, lb = cur, i-l+1
+        cumscore[i+1] = best
+        lbound[i+1] = lb
+    return _bounds(lbound, n1)
+
+
+def L1partition(n1, x, epsilon, ratio, seed):
+    """Noisy L1 partition with all interval buckets."""
+    n = len(x)
+    invepsilon1 = 1.0 / (epsilon*ratio)
+    invepsilon2 = 1.0 / (epsilon - epsilon*ratio)
+    rnum = numpy.random.RandomState(seed)
+    xi = numpy.asarray(x).astype(numpy.int64)
+    blocks = _DyadicBlocks(xi)
+    prefix = numpy.concatenate([[0], numpy.cumsum(xi)])
+
+    # best[e] and bestlb[e] hold the best bucket ending at e-1 among those
+    # starting before e-1, taking the first minimum as the scan in cutil.cpp
+    cumscore = numpy.zeros(n+1)
+    best = numpy.empty(n+1)
+    best.fill(numpy.inf)
+    bestlb = numpy.zeros(n+1, dtype=numpy.int64)
+    lbound = [-1] * (n+1)
+
+    # buckets are scored a group of starts at a time, in the order the random
+    # numbers are drawn in cutil.cpp (by start and then length), so memory
+    # stays O(n) instead of holding all n(n+1)/2 buckets
+    j0 = 0
+    while j0 < n:
+        counts = numpy.arange(n-j0, 0, -1)
+        j1 = j0 + max(1, numpy.searchsorted(numpy.cumsum(counts), _CHUNK, side='right'))
+        counts = counts[:j1-j0]
+        lo = numpy.repeat(numpy.arange(j0, j1), counts)
+        size = numpy.arange(len(lo)) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + 1
+        score = _deviation(blocks, prefix, lo, lo + size)
+        r = 0.5 - rnum.random_sample(len(score))
+        scale = (2.0 - 1.0/size - 1.0/n) * invepsilon1
+        score = _noisy(score, r, scale, invepsilon2, size == 1)
+
+        start = 0
+        for j in range(j0, j1):
+            # all buckets ending before j are in, so cumscore[j] is final
+            row = score[start:start+n-j]
+            start += n-j
+            cur = cumscore[j] + row[1:]
+            better = cur < best[j+2:]
+            best[j+2:][better] = cur[better]
+            bestlb[j+2:][better] = j
+            cumscore[j+1] = cumscore[j] + row[0]
+            lbound[j+1] = j
+            if best[j+1] < cumscore[j+1]:
+                cumscore[j+1] = best[j+1]
+                lbound[j+1] = bestlb[j+1]
+        j0 = j1
+    return _bounds(lbound, n1)
+
+
+def L1partition_batch(hist, x, epsilon, ratio, seed, approx):
+    """Partition every row of x, writing the boundaries to the rows of hist."""
+    run = L1partition_approx if approx else L1partition
+    for i in range(len(hist)):
+        hist[i] = run(hist.shape[1], x[i], epsilon[i], ratio[i], seed[i])
+
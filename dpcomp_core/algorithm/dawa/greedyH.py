@@ -3,20 +3,32 @@ from __future__ import division
 from builtins import map
 from builtins import zip
 from builtins import range
+import hashlib
 import itertools
 import numpy
 from scipy.linalg import block_diag
 from dpcomp_core import util
+from dpcomp_core.mixins import Cache
 from dpcomp_core.algorithm import estimate_engine 
 
+# memory budget of the strategy cache, in bytes
+STRATEGY_CACHE_BYTES = 16 * 2**20
+
 
 class greedyH_engine(estimate_engine.estimate_engine):
     """Assign weights to hierarchical queries greedily according to the given
     workload. Answer weighted queries and generate an estimated dataset using
     least square estimator.
     This is only an estimate engine. Use greedyH_only_engine for GreedyH algorithm.
+
+    The strategy depends only on QtQ, so it is cached and shared by later
+    runs on the same workload and partition. Under dawa_engine the partition
+    is noisy and most keys never repeat, so the cache is a bounded LRU of its
+    own (see reset_strategies) rather than the unbounded Cacheable one.
     """
 
+    _strategies = Cache(default_budget=STRATEGY_CACHE_BYTES)
+
     def __init__(self, branch=2, granu=100):
         """Setup the branching factor and granularity in numerical search.
         
@@ -42,22 +54,73 @@ class greedyH_engine(estimate_engine.estimate_engine):
         assert len(x.shape)==1, '%s is defined for 1D data only' % self.__class__.__name__
         
 
-        n = len(x)
-        err, inv, dist, query = self._GreedyHierByLv(QtQ, n, 0, withRoot=False)
-        qmat = []
-        y2 = []
-        for c in range(len(dist)):
-            if dist[c] > 0:
-                lb, rb = query[c]
-                currow = numpy.zeros(n)
-                currow[lb:rb+1] = dist[c]
-                qmat.append(currow)
-                y2.append(sum(x[lb:(rb+1)]) * dist[c])
-
-        qmat = numpy.array(qmat)
+        inv, lbs, rbs, wgt, y2 = self._Strategy(QtQ, x)
         y2 += prng.laplace(0.0, util.old_div(1.0,epsilon), len(y2))
 
-        return numpy.dot(inv, numpy.dot(qmat.T, y2))
+        return self._Estimate(inv, lbs, rbs, wgt, y2, len(x))
+
+    def RunBatch(self, QtQ, x, epsilon, seeds):
+        """Like Run, once per seed, choosing the strategy only once."""
+        prngs = estimate_engine.BatchRandomState(seeds)
+
+        x = numpy.array(x)
+        assert len(x.shape)==1, '%s is defined for 1D data only' % self.__class__.__name__
+
+        inv, lbs, rbs, wgt, y2 = self._Strategy(QtQ, x)
+        y2 = y2 + prngs.laplace(0.0, util.old_div(1.0,epsilon), len(y2))
+
+        return numpy.array([self._Estimate(inv, lbs, rbs, wgt, y, len(x)) for y in y2])
+
+    def _Strategy(self, QtQ, x):
+        """Choose the weighted hierarchical queries for workload QtQ.
+
+        Returns: inv, lbs, rbs, wgt, y2
+        inv - the inverse of A^TA for the weighted query matrix A, as a HierInverse
+        lbs, rbs, wgt - bounds and weights of the queries with positive weight
+        y2 - the (noise free) answers of those queries on x
+        """
+        n = len(x)
+        key = self._StrategyKey(QtQ, n)
+        cache = greedyH_engine._strategies
+        if cache.is_present('strategy', key):
+            err, inv, dist, query = cache.get('strategy', key)
+        else:
+            err, inv, dist, query = cache.set('strategy', key, self._GreedyHierByLv(QtQ, n, 0))
+        asked = dist > 0
+        lbs, rbs = numpy.array(query, dtype=int)[asked].T
+        wgt = dist[asked]
+        prefix = numpy.concatenate([[0], numpy.cumsum(x)])
+
+        return inv, lbs, rbs, wgt, (prefix[rbs+1] - prefix[lbs]) * wgt
+
+    @staticmethod
+    def _Estimate(inv, lbs, rbs, wgt, y, n):
+        """Least square estimate inv * A^T y, where row c of A has weight
+        wgt[c] on [lbs[c], rbs[c]]. A^T y is built as a difference array.
+        """
+        diff = numpy.zeros(n+1)
+        numpy.add.at(diff, lbs, wgt * y)
+        numpy.add.at(diff, rbs+1, -wgt * y)
+
+        return inv.dot(numpy.cumsum(diff)[:n])
+
+    @staticmethod
+    def reset_strategies(budget=STRATEGY_CACHE_BYTES):
+        """Empty the strategy cache and set its budget in bytes (None is unbounded)."""
+        greedyH_engine._strategies = Cache(default_budget=budget)
+
+    @staticmethod
+    def strategy_stats():
+        """Hit/miss/eviction counters of the strategy cache."""
+        return greedyH_engine._strategies.stats()['strategy']
+
+    def _StrategyKey(self, QtQ, n):
+        """Fingerprint of the inputs _GreedyHierByLv depends on."""
+        QtQ = numpy.ascontiguousarray(QtQ, dtype=float)
+        m = hashlib.sha1()
+        m.update(QtQ.tobytes())
+        m.update(util.prepare_for_hash(str((QtQ.shape, n, self._branch, self._granu))))
+        return m.hexdigest()
 
     def _GreedyHierByLv(self, fullQtQ, n, offset, depth = 0, withRoot = False):
         """Compute the weight distribution of one node of the tree by minimzing
@@ -74,21 +137,19 @@ class greedyH_engine(estimate_engine.estimate_engine):
         Returns: error, inv, weights, queries
         error - the variance of query on current node with epsilon=1
         inv - for the query strategy (the actrual weighted queries to be asked)
-              matrix A, inv is the inverse matrix of A^TA
+              matrix A, inv is the inverse matrix of A^TA (as a HierInverse)
         weights - the weights of queries to be asked
         queries - the list of queries to be asked (all with weight 1)
         """
         if n == 1:
             return numpy.linalg.norm(fullQtQ[:, offset], 2)**2, \
-                   numpy.array([[1.0]]), \
+                   HierInverse.uniform(1), \
                    numpy.array([1.0]), [[offset, offset]]
 
         QtQ = fullQtQ[:, offset:offset+n]
         if (numpy.min(QtQ, axis=1) == numpy.max(QtQ, axis=1)).all():
-            mat = numpy.zeros([n, n])
-            mat.fill(util.old_div(1.0, n**2))
             return numpy.linalg.norm(QtQ[:,0], 2)**2, \
-                   mat, numpy.array([1.0]), [[offset, offset+n-1]]
+                   HierInverse.uniform(n), numpy.array([1.0]), [[offset, offset+n-1]]
 
         if n <= self._branch:
             bound = list(zip(list(range(n)), list(range(1,n+1))))
@@ -102,7 +163,7 @@ class greedyH_engine(estimate_engine.estimate_engine):
         serr, sinv, sdist, sq = list(zip(*[self._GreedyHierByLv
                                     (fullQtQ, c[1]-c[0], offset+c[0], 
                                     depth = depth+1) for c in bound]))
-        invAuList = [c.sum(axis=0) for c in sinv]
+        invAuList = [c.colsum for c in sinv]
         invAu = numpy.hstack(invAuList)
         k = invAu.sum()
         m1 = sum(map(lambda rng, v:
@@ -112,7 +173,7 @@ class greedyH_engine(estimate_engine.estimate_engine):
         sumerr = sum(serr)
 
         if withRoot:
-            return sumerr, block_diag(*sinv), \
+            return sumerr, HierInverse(n, sinv), \
                    numpy.hstack([[0], numpy.hstack(sdist)]), \
                    [[offset, offset+n-1]] + list(itertools.chain(*sq))
 
@@ -123,10 +184,56 @@ class greedyH_engine(estimate_engine.estimate_engine):
 
         err = toterr.min() * self._granu**2
         perc = 1 - util.old_div(numpy.argmin(toterr), float(self._granu))
-        inv = (util.old_div(1.0,perc))**2 * (block_diag(*sinv) 
-              - (1-perc)**2 / ( perc**2 + k * (1-perc)**2 )
-              * numpy.dot(invAu.reshape([n, 1]), invAu.reshape([1, n])))
+        inv = HierInverse(n, sinv, (util.old_div(1.0,perc))**2,
+                          (1-perc)**2 / ( perc**2 + k * (1-perc)**2 ), invAu)
         dist = numpy.hstack([[1-perc], perc*numpy.hstack(sdist)])
         return err, inv, dist, \
                [[offset, offset+n-1]] + list(itertools.chain(*sq))
 
+
+class HierInverse(object):
+    """The symmetric n x n matrix scale * (block_diag(*blocks) - coef * u u^T),
+    where blocks are HierInverse matrices (no blocks stands for zeros).
+
+    This is the form of the greedy hierarchy's inverse of A^TA: it takes
+    O(n log n) memory instead of O(n^2), and dot never densifies it.
+    """
+
+    def __init__(self, n, blocks=(), scale=1.0, coef=0.0, u=None):
+        self.n = n
+        self.blocks = list(blocks)
+        self.scale = scale
+        self.coef = coef
+        self.u = numpy.zeros(n) if u is None else u
+        self.colsum = self.scale * (self._blocks_colsum() - self.coef * self.u * self.u.sum())
+
+    @staticmethod
+    def uniform(n):
+        """The n x n matrix with every entry 1/n^2"""
+        return HierInverse(n, coef=-util.old_div(1.0, n**2), u=numpy.ones(n))
+
+    def _blocks_colsum(self):
+        if not self.blocks:
+            return numpy.zeros(self.n)
+        return numpy.hstack([b.colsum for b in self.blocks])
+
+    def dot(self, v):
+        """Product with a vector, or with a matrix of n rows"""
+        if self.blocks:
+            parts = []
+            offset = 0
+            for b in self.blocks:
+                parts.append(b.dot(v[offset:offset+b.n]))
+                offset += b.n
+            res = numpy.concatenate(parts)
+        else:
+            res = numpy.zeros(v.shape)
+        res -= self.coef * numpy.multiply.outer(self.u, numpy.dot(self.u, v))
+        return self.scale * res
+
+    def toarray(self):
+        if self.blocks:
+            res = block_diag(*[b.toarray() for b in self.blocks])
+        else:
+            res = numpy.zeros([self.n, self.n])
+        return self.scale * (res - self.coef * numpy.outer(self.u, self.u))
@@ -4,11 +4,25 @@ import numpy
 import os
 import sys
 import logging
-from dpcomp_core.algorithm.dawa.cutils import cutil
+try:
+    from dpcomp_core.algorithm.dawa.cutils import cutil
+    _fallback = False
+except ImportError:
+    # the C extension was not built (see setup.sh); same results, ~2-3x slower
+    from dpcomp_core.algorithm.dawa.cutils import pycutil as cutil
+    _fallback = True
 from dpcomp_core.algorithm.dawa.partition_engines import partition_engine
 from dpcomp_core import util
 
 
+def _warn_fallback():
+    """Warn the first time the NumPy L1 partition is used."""
+    global _fallback
+    if _fallback:
+        logging.warning('dawa C extension not found, using the NumPy L1 partition')
+        _fallback = False
+
+
 class l1partition_engine(partition_engine.partition_engine):
     """Use the L1 partition method."""
 
@@ -19,6 +33,10 @@ class l1partition_engine(partition_engine.partition_engine):
     def Run(x, epsilon, ratio,seed):
         return L1partition(x, epsilon, ratio, gethist=True,seed =seed)
 
+    @staticmethod
+    def RunBatch(xs, epsilon, ratio, seeds):
+        return L1partition_batch(xs, epsilon, ratio, gethist=True, seeds=seeds, approx=False)
+
 
 class l1partition_approx_engine(partition_engine.partition_engine):
     """Use the approximate L1 partition method."""
@@ -30,6 +48,10 @@ class l1partition_approx_engine(partition_engine.partition_engine):
     def Run(x, epsilon, ratio,seed):
         return L1partition_approx(x, epsilon, ratio, gethist=True,seed = seed)
 
+    @staticmethod
+    def RunBatch(xs, epsilon, ratio, seeds):
+        return L1partition_batch(xs, epsilon, ratio, gethist=True, seeds=seeds, approx=True)
+
 
 def L1partition(x, epsilon, ratio=0.5, gethist=False,seed=None):
     """Compute the noisy L1 histogram using all interval buckets
@@ -54,26 +76,9 @@ def L1partition(x, epsilon, ratio=0.5, gethist=False,seed=None):
     x=y
 
     n = len(x)
+    _warn_fallback()
     hist = cutil.L1partition(n+1, x, epsilon, ratio, prng.randint(500000))
-    hatx = numpy.zeros(n)
-    rb = n
-    if gethist:
-        bucks = []
-        for lb in hist[1:]:
-            bucks.insert(0, [lb, rb-1])
-            rb = lb
-            if lb == 0:
-                break
-        logging.debug('  L1-PART: number of buckets %s' % str(bucks[:5]) )                   
-        return bucks
-    else:
-        for lb in hist[1:]:
-            hatx[lb:rb] = util.old_div(max(0, sum(x[lb:rb]) + prng.laplace(0, util.old_div(1.0,(epsilon*(1-ratio))), 1)), float(rb - lb))
-            rb = lb
-            if lb == 0:
-                break
-
-        return hatx
+    return _histogram(x, hist, epsilon, ratio, gethist, prng)
 
 
 def L1partition_approx(x, epsilon, ratio=0.5, gethist=False,seed =None):
@@ -100,23 +105,60 @@ def L1partition_approx(x, epsilon, ratio=0.5, gethist=False,seed =None):
     assert check.sum() == len(check), "Casting error from int to int32"
     x=y
 
+    _warn_fallback()
     hist = cutil.L1partition_approx(n+1, x, epsilon, ratio, prng.randint(500000))
-    hatx = numpy.zeros(n)
-    rb = n
+    return _histogram(x, hist, epsilon, ratio, gethist, prng)
+
+
+def L1partition_batch(xs, epsilon, ratio=0.5, gethist=False, seeds=None, approx=True):
+    """Run L1partition_approx (or L1partition if approx is False) on every
+    row of xs in one native call, which releases the GIL and runs the jobs
+    in parallel when the extension is built with OpenMP.
+
+    Args:
+        xs - 2D int array, one input data vector per row
+        epsilon, ratio - as in L1partition, either one value or one per row
+        gethist - as in L1partition
+        seeds - one seed per row
+
+    Return:
+        a list with, for every row, what L1partition would return for it
+    """
+    assert seeds is not None and all(seed is not None for seed in seeds), "seeds must be set"
+    prngs = [numpy.random.RandomState(seed) for seed in seeds]
+
+    xs = numpy.asarray(xs)
+    assert (xs.dtype == numpy.dtype(int) or xs.dtype == numpy.dtype("int32")), "Input vector must be int! %s given" %xs.dtype
+    y=xs.astype('int32')
+    assert (xs == y).all(), "Casting error from int to int32"
+    xs=y
+
+    jobs, n = xs.shape
+    assert len(prngs) == jobs, "one seed per row is needed"
+    epsilon = numpy.broadcast_to(numpy.asarray(epsilon, dtype=float), (jobs,)).copy()
+    ratio = numpy.broadcast_to(numpy.asarray(ratio, dtype=float), (jobs,)).copy()
+    cseeds = numpy.array([prng.randint(500000) for prng in prngs], dtype=numpy.int_)
+
+    hist = numpy.zeros((jobs, n+1), dtype=numpy.intc)
+    _warn_fallback()
+    cutil.L1partition_batch(hist, xs.astype(float), epsilon, ratio, cseeds, int(approx))
+    return [_histogram(x, h, e, r, gethist, prng) for (x, h, e, r, prng) in zip(xs, hist, epsilon, ratio, prngs)]
+
+
+def _histogram(x, hist, epsilon, ratio, gethist, prng):
+    """Turn the output of the C partition code into Buckets, or (if gethist
+    is False) into an estimate of x with one noisy count per bucket.
+
+    hist lists the bucket boundaries from n down to 0; entries after the 0
+    are not set.
+    """
+    n = len(x)
+    bounds = hist[1:]
+    buckets = partition_engine.Buckets(bounds[:numpy.argmax(bounds == 0)+1][::-1], n)
     if gethist:
-        bucks = []
-        for lb in hist[1:]:
-            bucks.insert(0, [lb, rb-1])
-            rb = lb
-            if lb == 0:
-                break
-              
-        return bucks
+        logging.debug('  L1-PART: number of buckets %s' % len(buckets))
+        return buckets
     else:
-        for lb in hist[1:]:
-            hatx[lb:rb] = util.old_div(max(0, sum(x[lb:rb]) + prng.laplace(0, util.old_div(1.0,(epsilon*(1-ratio))), 1)), float(rb - lb))
-            rb = lb
-            if lb == 0:
-                break
-
-        return hatx
+        # noise is drawn for the last bucket first
+        noise = prng.laplace(0, util.old_div(1.0,(epsilon*(1-ratio))), len(buckets))[::-1]
+        return buckets.expand(numpy.maximum(0, buckets.reduce(x) + noise))
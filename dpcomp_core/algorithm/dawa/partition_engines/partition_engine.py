@@ -2,6 +2,8 @@
 
 
 from builtins import object
+from builtins import range
+import numpy
 class partition_engine(object):
 	"""The template class for partition engines."""
 
@@ -17,3 +19,55 @@ class partition_engine(object):
 								  ' for a partition engine.')
 
 
+class Buckets(object):
+	"""A partition of the domain 0..n-1 into contiguous buckets, stored as
+	the array of their left boundaries.
+
+	Iterating and indexing give [lb, rb] pairs like the list based
+	partitions used before, while reduce and expand work on whole arrays.
+	"""
+
+	def __init__(self, lbs, n):
+		self.lbs = numpy.asarray(lbs, dtype=int)
+		self.n = n
+		assert len(self.lbs) > 0 and self.lbs[0] == 0, 'Buckets must start at 0'
+		assert (numpy.diff(self.lbs) > 0).all() and self.lbs[-1] < n, 'Buckets must be increasing within the domain'
+
+	@staticmethod
+	def identity(n):
+		"""One bucket per cell."""
+		return Buckets(numpy.arange(n), n)
+
+	@staticmethod
+	def from_pairs(partition):
+		"""Buckets from a list of [lb, rb] pairs."""
+		if isinstance(partition, Buckets):
+			return partition
+		return Buckets([lb for lb, rb in partition], partition[-1][-1] + 1)
+
+	@property
+	def rbs(self):
+		return numpy.append(self.lbs[1:], self.n) - 1
+
+	@property
+	def sizes(self):
+		return numpy.diff(numpy.append(self.lbs, self.n))
+
+	def reduce(self, x):
+		"""Total of x over every bucket."""
+		return numpy.add.reduceat(x, self.lbs)
+
+	def expand(self, counts):
+		"""Spread the count of every bucket uniformly over its cells."""
+		return numpy.repeat(counts / self.sizes.astype(float), self.sizes)
+
+	def __len__(self):
+		return len(self.lbs)
+
+	def __getitem__(self, c):
+		c = range(len(self.lbs))[c]
+		rb = self.lbs[c+1] - 1 if c+1 < len(self.lbs) else self.n - 1
+		return [self.lbs[c], rb]
+
+	def __iter__(self):
+		return iter(numpy.column_stack([self.lbs, self.rbs]).tolist())
@@ -4,11 +4,12 @@ from builtins import str
 from builtins import range
 from builtins import object
 import bisect
-import itertools
 import numpy
+import scipy.sparse
 import hashlib
 from dpcomp_core import util
 from dpcomp_core import workload
+from dpcomp_core.algorithm.dawa.partition_engines.partition_engine import Buckets
 
 #@register('default')
 class routine_engine(object):
@@ -78,18 +79,51 @@ class routine_engine(object):
                 raise ValueError('ratio must in range [0, 1)')
 
             partition = self.Compute_partition(x, epsilon,pSeed)
-            # check that partition buckets span domain
-            assert min(itertools.chain(*partition)) == 0
-            assert max(itertools.chain(*partition)) == (n-1)
+            return self._PartitionRun(Q, x, epsilon, partition, eSeed)
 
-            eps2 = (1-self._ratio) * epsilon   # this is epsilon_2 used in paper (the epsilon for estimation)
-            devs = abs( numpy.array(x) - (util.old_div(sum(x), float(len(x)))) )
+    def _PartitionRun(self, Q, x, epsilon, partition, eSeed):
+        """Estimate x on the buckets of a computed partition"""
+        n = len(x)
+        partition = Buckets.from_pairs(partition)
+        # check that partition buckets span domain (Buckets start at 0)
+        assert partition.n == n
+
+        eps2 = (1-self._ratio) * epsilon   # this is epsilon_2 used in paper (the epsilon for estimation)
+
+        counts = self._estimate_engine.Run(
+                    self._workload_reform(Q, partition, n),
+                    self._dataset_reform(x, partition),
+                    epsilon*(1-self._ratio),eSeed)
+        return self._rebuild(partition, counts, n)
+
+    def RunBatch(self, Q, x, epsilon, seeds):
+        """Run once per seed and stack the estimates. Without a partition
+        engine, the workload is reformed only once for all seeds. Partition
+        engines with a RunBatch compute all partitions in one call.
+        """
+        assert all(seed is not None for seed in seeds), 'seeds must be set'
+        pSeeds, eSeeds = [], []
+        for seed in seeds:
+            prng = numpy.random.RandomState(seed)
+            pSeeds.append(prng.randint(500000))
+            eSeeds.append(prng.randint(500000))
 
-            counts = self._estimate_engine.Run(
-                        self._workload_reform(Q, partition, n),
-                        self._dataset_reform(x, partition),
-                        epsilon*(1-self._ratio),eSeed)
-            return self._rebuild(partition, counts, n)
+        if self._partition_engine is None:
+            return self._DirectRunBatch(Q, x, epsilon, eSeeds)
+        if self._ratio == 0 or not hasattr(self._partition_engine, 'RunBatch'):
+            return numpy.array([self.Run(Q, x, epsilon, seed) for seed in seeds])
+        if self._ratio < 0 or self._ratio >= 1:
+            raise ValueError('ratio must in range [0, 1)')
+
+        x = numpy.asarray(x)
+        partitions = self._partition_engine.RunBatch(numpy.tile(x, (len(seeds), 1)), epsilon,
+                                                     self._ratio, pSeeds)
+        return numpy.array([self._PartitionRun(Q, x, epsilon, partition, eSeed)
+                            for (partition, eSeed) in zip(partitions, eSeeds)])
+
+    def _DirectRunBatch(self, Q, x, epsilon, seeds):
+        """Run a estimate engine without a partition engine, once per seed"""
+        return numpy.array([self._DirectRun(Q, x, epsilon, seed) for seed in seeds])
 
     def Get_Partition(self):
         """Get the data dependent partition"""
@@ -100,7 +134,7 @@ class routine_engine(object):
         if self._ratio == 0:
             # use identity partition if no privacy budget is
             # reserved for partitioning
-            self._partition = [[c, c] for c in range(n)]
+            self._partition = Buckets.identity(len(x))
         else:
             self._partition = self._partition_engine.Run(x, epsilon,
                                                          self._ratio,pSeed)
@@ -114,18 +148,15 @@ class routine_engine(object):
     @staticmethod
     def _dataset_reform(x, partition):
         """Reform a dataset x0 into x with a given parition."""
-        return [sum(x[lb:(rb+1)]) for lb, rb in partition]
+        return Buckets.from_pairs(partition).reduce(numpy.asarray(x))
         
     @staticmethod
     def _rebuild(partition, counts, n):
         """Rebuild an estimated data using uniform expansion."""
-        estx = numpy.zeros(n)
-        n2 = len(counts)
-        for c in range(n2):
-            lb, rb = partition[c]
-            estx[lb:(rb+1)] = util.old_div(counts[c], float(rb - lb + 1))
+        partition = Buckets.from_pairs(partition)
+        assert partition.n == n
 
-        return estx
+        return partition.expand(numpy.asarray(counts))
 
 
 #@register('transformQ')
@@ -190,21 +221,28 @@ class transform_engine_qtqmatrix(routine_engine):
     def _DirectRun(self, Q, x, epsilon,seed):
         """Run a estimate engine without a partition engine"""
         n = len(x)
-        partition = [[c,c] for c in range(n)]
+        partition = Buckets.identity(n)
         return self._estimate_engine.Run(
             self._workload_reform(Q, partition, n), x, epsilon,seed)
 
+    def _DirectRunBatch(self, Q, x, epsilon, seeds):
+        """Run a estimate engine without a partition engine, once per seed"""
+        n = len(x)
+        partition = Buckets.identity(n)
+        return self._estimate_engine.RunBatch(
+            self._workload_reform(Q, partition, n), x, epsilon, seeds)
+
     def _workload_reform(self, Q0, partition, n):
         """Reform a workload Q0 into Q with a given partition,
         and output Q^TQ
 
-        max_block_size - the max number of rows to be materialized
+        max_block_size - the max number of queries to be processed at once
                          when computing Q^TQ. Set to n if omitted.
         """
 
-        if isinstance(Q0, workload.Workload):
-            Q0 = Q0.query_list
         n = partition[-1][-1] + 1
+        if not isinstance(Q0, workload.Workload):
+            Q0 = workload.Workload(Q0, (n,))
         n2 = len(partition)
         QtQ = numpy.zeros([n2, n2])
         if self._max_block_size is None:
@@ -212,22 +250,11 @@ class transform_engine_qtqmatrix(routine_engine):
         else:
             max_block_size = self._max_block_size
 
-        cnum = list(range(0, len(Q0), max_block_size))
-
-        for c0 in cnum:
-            nrow = min(len(Q0)-c0, max_block_size)
-            Q0mat = numpy.zeros([nrow, n])
-
-            for c in range(nrow):
-                for qRange in Q0[c+c0].ranges:
-                    Q0mat[c, qRange.lb[0]:qRange.ub[0]+1] = qRange.wgt
-
-            Qmat = numpy.zeros([nrow, n2])
-            for c in range(n2):
-                lb, rb = partition[c]
-                Qmat[:, c] = Q0mat[:, lb:(rb+1)].mean(axis=1)
-
-            QtQ += numpy.dot(Qmat.T, Qmat)
+        lb, ub, wgt, qid = Q0.range_arrays()
+        for c0 in range(0, Q0.size, max_block_size):
+            # qid is non-decreasing, so the ranges of a block of queries are contiguous
+            (first, last) = numpy.searchsorted(qid, [c0, c0 + max_block_size])
+            QtQ += range_qtq(lb[first:last, 0], ub[first:last, 0], wgt[first:last], partition, qid[first:last])
 
         return QtQ
 
@@ -249,7 +276,12 @@ class transform_engine_qtqmatrix_linear(transform_engine_qtqmatrix):
         """
         # check for type of Q0
         if isinstance(Q0, workload.Workload):
-            Q0 = Q0.query_list
+            assert (partition[-1][-1] + 1) == n
+            return super(transform_engine_qtqmatrix_linear, self)._workload_reform(Q0, partition, n)
+        if scipy.sparse.issparse(Q0):
+            assert (partition[-1][-1] + 1) == n
+            Qmat = bucket_average(Q0.tocsr(), partition)
+            return Qmat.T.dot(Qmat).toarray()
         if len(Q0.shape) == 3:  # total hack: if the workload is range queries, then first tfm them to matrix
             # run "old" code (transform_engine_qtqmatrix) and save result to compare against
             QtQold = super(transform_engine_qtqmatrix_linear, self)._workload_reform(Q0, partition, n)
@@ -277,6 +309,57 @@ class transform_engine_qtqmatrix_linear(transform_engine_qtqmatrix):
             assert (QtQold == QtQ).all()
         return QtQ
 
+def bucket_average(Q0mat, partition):
+    """
+    Takes Q0mat, a sparse m x n workload matrix, and returns the sparse m x n2 matrix of
+    queries over the buckets of partition: each entry is the average query weight on the bucket
+    """
+    n = Q0mat.shape[1]
+    partition = Buckets.from_pairs(partition)
+    sizes = partition.sizes.astype(float)
+    bucket = numpy.repeat(numpy.arange(len(partition)), partition.sizes)
+    assert partition.n == n
+    indicator = scipy.sparse.csr_matrix((numpy.ones(n), (numpy.arange(n), bucket)), shape=(n, len(partition)))
+    Qmat = Q0mat.dot(indicator).tocsr()
+    Qmat.data /= sizes[Qmat.indices]
+    return Qmat
+
+def range_qtq(lb, ub, wgt, partition, qid=None):
+    """
+    Returns the n2 x n2 matrix Q^TQ for the 1d range queries wgt[i] * x[lb[i]:ub[i]+1] averaged over
+    the buckets of partition, without materializing Q. Ranges with the same qid are summed into one
+    query (qid defaults to one query per range).
+
+    Averaged over buckets, a range is a partially covered bucket at either end plus a run of fully
+    covered buckets in between, so every query row is piecewise constant: it is the cumsum of a
+    difference row with two entries per piece. Q^TQ is then the cumsum, along both axes, of D^TD
+    for the sparse matrix D of difference rows.
+    """
+    partition = Buckets.from_pairs(partition)
+    n2 = len(partition)
+    lbs, rbs = partition.lbs, partition.rbs
+    sizes = partition.sizes.astype(float)
+    if qid is None:
+        qid = numpy.arange(len(lb))
+    bl = numpy.searchsorted(lbs, lb, side='right') - 1
+    bu = numpy.searchsorted(lbs, ub, side='right') - 1
+    single = bl == bu
+
+    # pieces (first bucket, last bucket, value) of every range: left end, middle and right end
+    left = numpy.where(single, ub - lb + 1, rbs[bl] - lb + 1) * wgt / sizes[bl]
+    right = numpy.where(single, 0, wgt * (ub - lbs[bu] + 1) / sizes[bu])
+    middle = numpy.where(bl + 1 < bu, wgt, 0)
+    first = numpy.concatenate([bl, numpy.minimum(bl + 1, bu), bu])
+    last = numpy.concatenate([bl, numpy.maximum(bu - 1, bl), bu])
+    value = numpy.concatenate([left, middle, right])
+
+    queries, row = numpy.unique(qid, return_inverse=True)
+    row = numpy.tile(row, 3)
+    D = scipy.sparse.csr_matrix((numpy.concatenate([value, -value]),
+                                 (numpy.concatenate([row, row]), numpy.concatenate([first, last + 1]))),
+                                shape=(len(queries), n2 + 1))
+    return D.T.dot(D).toarray().cumsum(axis=0).cumsum(axis=1)[:n2, :n2]
+
 def as_matrix(Q, n):
     """
     Takes Q, a collection of m queries, in 1d range query form and returns an m x n workload matrix
@@ -3,15 +3,21 @@
 from setuptools import *
 #from distutils import sysconfig
 import numpy
+import os
 
 try:
     numpy_include = numpy.get_include()
 except AttributeError:
     numpy_include = numpy.get_numpy_include()
 
+# set DPCOMP_OPENMP=1 to run the jobs of L1partition_batch in parallel (OMP_NUM_THREADS threads)
+openmp = ['-fopenmp'] if os.environ.get('DPCOMP_OPENMP') else []
+
 _cutil = Extension("_cutil",
                     sources = ["./cutils/mtrand.cpp", "./cutils/cutil.i", "./cutils/cutil.cpp"],
                     include_dirs = [numpy_include],
+                    extra_compile_args = openmp,
+                    extra_link_args = openmp,
                 )
 
 setup( name = "cutil",
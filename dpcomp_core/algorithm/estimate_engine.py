@@ -1,8 +1,26 @@
 from builtins import str
 import hashlib
+import numpy
 from dpcomp_core.mixins import Marshallable
 from dpcomp_core import util
 
+class BatchRandomState(object):
+    """Holds one numpy.random.RandomState per seed. Draws are made from
+    each in turn and stacked along a new leading axis, so row i equals the
+    draw a single run seeded with seeds[i] would make.
+    """
+
+    def __init__(self, seeds):
+        assert all(seed is not None for seed in seeds), 'seeds must be set'
+        self.prngs = [numpy.random.RandomState(seed) for seed in seeds]
+
+    def __len__(self):
+        return len(self.prngs)
+
+    def laplace(self, loc=0.0, scale=1.0, size=None):
+        return numpy.array([prng.laplace(loc, scale, size) for prng in self.prngs])
+
+
 class estimate_engine(Marshallable):
     """The template class for query engine."""
 
@@ -22,6 +40,15 @@ class estimate_engine(Marshallable):
                                   ' for a query engine.')
         pass
 
+    def RunBatch(self, Q, x, epsilon, seeds):
+        """Return one estimate of x per seed, stacked into a
+        (trials x domain) array. Row i equals Run(Q, x, epsilon, seeds[i]).
+
+        Engines override this to reuse data-independent work across trials.
+        """
+        assert all(seed is not None for seed in seeds), 'seeds must be set'
+        return numpy.array([self.Run(Q, x, epsilon, seed) for seed in seeds])
+
     def asDict(self):
         d = util.class_to_dict(self)
         return d
@@ -36,7 +36,9 @@ from __future__ import division
 from builtins import map
 from builtins import range
 from builtins import object
+import itertools
 import math
+import numpy
 from functools import reduce
 from dpcomp_core import util
 
@@ -143,6 +145,121 @@ class HTree(object):
 
 
 
+class LevelTree(object):
+	"""Complete tree with arity k along each of the last ndim axes, stored as one array per level.
+
+	Level 0 holds the root and the last level the leaves; a node at level l has k**ndim children,
+	ordered row-major, at level l+1. Any leading axes of leaf_counts are treated as a batch of
+	independent trees. Counts and inference give the same results as HTree, node for node.
+	"""
+	def __init__(self, arity, leaf_counts, ndim=1):
+		self.k = arity
+		self.ndim = ndim
+		self.branching = arity**ndim
+		leaf_counts = numpy.asarray(leaf_counts)
+		self.batch_shape = leaf_counts.shape[:leaf_counts.ndim-ndim]
+		n = leaf_counts.shape[-1]
+		assert all(s == n for s in leaf_counts.shape[leaf_counts.ndim-ndim:]), 'Leaves must form a hypercube'
+
+		height = 1
+		while arity**(height-1) < n:
+			height += 1
+		assert arity**(height-1) == n, \
+		'Invalid number of leaves, %d, must be power of %d' % (n, arity)
+		self.height = height
+
+		# counts per level, root first
+		self.counts = [leaf_counts]
+		for l in range(height-1):
+			self.counts.insert(0, self.children_sum(self.counts[0]))
+
+	@property
+	def size(self):
+		"Number of nodes in each tree"
+		return (self.branching**self.height - 1) // (self.branching - 1)
+
+	def children_sum(self, level):
+		"Sum over the children of every parent, adding children one at a time in order (like HTree)"
+		k, ndim = self.k, self.ndim
+		m = level.shape[-1] // k
+		blocks = level.reshape(level.shape[:level.ndim-ndim] + (m, k)*ndim)
+		total = 0
+		for child in itertools.product(range(k), repeat=ndim):
+			total = total + blocks[(Ellipsis,) + sum(((slice(None), c) for c in child), ())]
+		return total
+
+	def expand(self, level):
+		"Repeat the value of every parent for each of its children"
+		for axis in range(level.ndim-self.ndim, level.ndim):
+			level = numpy.repeat(level, self.k, axis=axis)
+		return level
+
+	def child_position(self, l):
+		"Position of every node at level l among its siblings"
+		n = self.k**l
+		digits = numpy.arange(n) % self.k
+		position = numpy.zeros((n,)*self.ndim, dtype=int)
+		for axis in range(self.ndim):
+			shape = [1]*self.ndim
+			shape[axis] = n
+			position = position * self.k + digits.reshape(shape)
+		return position
+
+	def postorder_index(self):
+		"Index of every node in a postorder traversal (children in order, then parent), level by level"
+		# number of nodes in a subtree rooted at level l
+		sizes = [(self.branching**(self.height-l) - 1) // (self.branching - 1) for l in range(self.height)]
+		offset = numpy.zeros((1,)*self.ndim, dtype=int)
+		index = [offset + sizes[0] - 1]
+		for l in range(1, self.height):
+			offset = self.expand(offset) + self.child_position(l) * sizes[l]
+			index.append(offset + sizes[l] - 1)
+		return index
+
+	def from_postorder(self, values):
+		"Split an array whose last axis lists nodes in postorder into one array per level"
+		return [values[..., idx] for idx in self.postorder_index()]
+
+	def inference(self, noisy):
+		"Least-squares consistent estimate of the leaves from one array of noisy counts per level (as HTree.inference)"
+		k = self.branching
+		# go bottom up to compute z[v]
+		z = [None]*self.height
+		total_z_children = [None]*self.height
+		z[-1] = noisy[-1]
+		for l in reversed(range(self.height-1)):
+			h = self.height - l
+			alpha = k**(h-1)
+			a = ((k-1)*alpha) * noisy[l]
+			total_z_children[l] = self.children_sum(z[l+1])
+			b = (alpha - 1) * total_z_children[l]
+			z[l] = util.old_div(a + b, float(k*alpha - 1))
+
+		# go top down to compute hbar[v]
+		hbar = z[0]
+		for l in range(1, self.height):
+			hbar = z[l] + self.expand(util.old_div((hbar - total_z_children[l-1]), k))
+		return hbar
+
+	def weighted_average(self, noisy, alpha, top=0):
+		"""First postprocessing of Qardaji et al. PVLDB 2013 (section 3.3): bottom up, every internal node
+		at or below level top becomes alpha[l] * noisy + (1 - alpha[l]) * (sum of its averaged children)"""
+		avg = list(noisy)
+		for l in reversed(range(top, self.height-1)):
+			tot = self.children_sum(avg[l+1])
+			avg[l] = alpha[l] * noisy[l] + (1-alpha[l]) * tot
+		return avg
+
+	def mean_consistency(self, counts, top=0):
+		"""Second postprocessing of Qardaji et al. PVLDB 2013 (section 3.3): top down from level top, the
+		difference between each parent and the sum of its children is spread evenly over the children.
+		Returns the leaves"""
+		current = counts[top]
+		for l in range(top+1, self.height):
+			current = counts[l] + 1.0 / self.branching * self.expand(current - self.children_sum(counts[l]))
+		return current
+
+
 import unittest
 class Test(unittest.TestCase):
 
@@ -179,6 +296,12 @@ class Test(unittest.TestCase):
 		self.assertAlmostEqual(util.old_div(-1.,3), leaves[0])
 		self.assertAlmostEqual(util.old_div(2.,3), leaves[1])
 
+	def test_level_tree(self):
+		ltree = LevelTree(2, [0]*2)
+		leaves = ltree.inference(ltree.from_postorder(numpy.array([1., 0., 0.])))
+		self.assertAlmostEqual(util.old_div(-1.,3), leaves[0])
+		self.assertAlmostEqual(util.old_div(2.,3), leaves[1])
+
 
 if __name__ == '__main__':
 	 unittest.main()
@@ -25,3 +25,8 @@ class identity_engine(estimate_engine.estimate_engine):
         prng = numpy.random.RandomState(seed)
 
         return x + prng.laplace(0.0, util.old_div(1.0, epsilon), x.shape)
+
+    def RunBatch(self, Q, x, epsilon, seeds):
+        prngs = estimate_engine.BatchRandomState(seeds)
+
+        return x + prngs.laplace(0.0, util.old_div(1.0, epsilon), x.shape)
@@ -28,7 +28,7 @@ class mwemND_simple_engine(estimate_engine.estimate_engine):
         assert seed is not None, 'seed must be set'
 
         prng = numpy.random.RandomState(seed)
-        Q1=list(Q.query_list)# leave Q as it is for future evaluation 
+        remaining = numpy.ones(Q.size, dtype=bool)   # leave Q as it is for future evaluation
 
         # here we assume the total count is known
         # create uniform estimate based on total count
@@ -38,16 +38,15 @@ class mwemND_simple_engine(estimate_engine.estimate_engine):
         selepsilon = epsilon * self._ratio
         queryepsilon = epsilon - selepsilon
         
-        assert(self._nrounds <= len(Q1)) # the maximum possible number of rounds is the size of Q. 
+        assert(self._nrounds <= Q.size) # the maximum possible number of rounds is the size of Q. 
         # selected queries will be removed from Q, added to list of estimated queries
         estQ = []
         nrounds = self._nrounds
         for c in range(nrounds):
-            i = self._exponentialMechanism(x, hatx, Q1, util.old_div(selepsilon, nrounds) ,prng)   # get index of selected query
-            q = Q1[i]
-            del Q1[i]    # no longer a candidate in next round
-            sens=q.sens()
-            est = q.eval(x) + prng.laplace(0.0, sens * nrounds / queryepsilon, 1)
+            i = self._exponentialMechanism(x, hatx, Q, remaining, util.old_div(selepsilon, nrounds) ,prng)   # get index of selected query
+            remaining[i] = False    # no longer a candidate in next round
+            q = _Mask(Q, i)
+            est = q.eval(x) + prng.laplace(0.0, q.sens() * nrounds / queryepsilon)
             estQ.append( (q,est) )
             hatx = self._update(hatx, q, est)   # update using only current q and estimate
 
@@ -55,50 +54,107 @@ class mwemND_simple_engine(estimate_engine.estimate_engine):
 
 
     @staticmethod   
-    def _exponentialMechanism(x, hatx, Q, epsilon,prng):
+    def _exponentialMechanism(x, hatx, Q, remaining, epsilon,prng):
         """Choose the worst estimated query (set) using the exponential mechanism.
 
         x - true data vector
         hatx - estimated data vector
-        Q - the queries to be chosen from
+        Q - workload of the queries to be chosen from
+        remaining - boolean mask of the queries of Q that are still candidates
         epsilon - private parameter
+
+        Returns the index in Q of the chosen query.
         """
-        diffx = x - hatx
-        # compute the error of each query 
-        error = numpy.array([abs(q.eval(diffx)) for q in Q])    # evaluate range queries on difference vector
+        # compute the error of each query at once from a summed-area table of the difference vector
+        candidates = numpy.flatnonzero(remaining)
+        error = numpy.absolute(Q.evaluate_prefix(x - hatx))[candidates]
 
         # compute the sampling probability
-        merr = max(error)
+        merr = error.max()
 
         logging.debug('  EXP-MECH: epsilon  %f' % epsilon )  
-        logging.debug('  EXP-MECH: OPTIMAL index %s / error %f / query %s' % (error.argmax(), merr, Q[error.argmax()]) )
+        logging.debug('  EXP-MECH: OPTIMAL index %s / error %f' % (candidates[error.argmax()], merr) )
         
         prob = numpy.exp( epsilon* (error - merr) / 2.0 )
 
-        logging.debug('  EXP-MECH: prob sum %f / prob %s' % (sum(prob), sorted(prob,reverse=True)[0:5]))
+        # the first candidate at which the running sum of prob reaches the sample
+        cumprob = numpy.cumsum(prob)
+        sample = prng.random_sample() * cumprob[-1]
+        c = min(numpy.searchsorted(cumprob, sample), len(prob)-1)
 
-        sample = prng.random_sample() * sum(prob)
-        for c in range(len(prob)):
-            sample -= prob[c]
-            if sample <= 0:
-                logging.debug('  EXP-MECH: CHOSEN index %s / error %f / query %s' % (c, error[c], Q[c]) )
-                return c
-        
-        logging.debug('  EXP-MECH: CHOSEN index %s / error %f / query %s' % (len(prob)-1, error[len(prob)-1], Q[len(prob)-1]) )
-        return len(prob)-1
+        logging.debug('  EXP-MECH: CHOSEN index %s / error %f' % (candidates[c], error[c]) )
+        return candidates[c]
 
     @staticmethod
     def _update(hatx, q, est):
         """basic multiplicative weight update.
         update one single query, one round"""
-        total = hatx.sum()
-        error = est - q.eval(hatx) # difference between query ans on current estimated data and the observed answer 
+        return mwemND_simple_engine._sweep(hatx, [(q, est)])
 
-        q1 = q.asArray(hatx.shape) # transform a query object into a nd array
-        
-        hatx = hatx * numpy.exp( q1 * error / (2.0 * total) )
-        hatx *= util.old_div(total, hatx.sum())     
-        return hatx
+    @staticmethod
+    def _sweep(hatx, estlist, rounds=1):
+        """Multiplicative weight updates with every (q, est) of estlist in turn,
+        rounds times, each followed by rescaling to the total of hatx.
+
+        Only the cells of q change in an update, so the estimate is kept as
+        h * scale, with the sum of h tracked as it changes, and the rescaling
+        is applied to all of h once per round.
+        """
+        total = hatx.sum()
+        h = numpy.array(hatx, dtype=float)
+        for c in range(rounds):
+            scale = 1.0
+            hsum = h.sum()
+            for (q, est) in estlist:
+                hsum += q.update(h, scale, est, total)
+                scale = util.old_div(total, hsum)
+            h *= util.old_div(total, h.sum())
+        return h
+
+
+class _Mask(object):
+    """The cells covered by one query of a workload and their weights, built
+    once when the query is selected. A query with a single range is kept as
+    a box of slices, so it is read and updated through a view of the data."""
+
+    def __init__(self, Q, i):
+        lb, ub, wgt, qid = Q.range_arrays()
+        (first, last) = numpy.searchsorted(qid, [i, i+1])
+        if last - first == 1:
+            self.cells = tuple(slice(l, u+1) for (l, u) in zip(lb[first], ub[first]))
+            self.weights = wgt[first]
+            self.box = True
+        else:
+            # overlapping ranges of a union add up
+            row = Q.from_ranges(lb[first:last], ub[first:last], Q.domain_shape, wgt[first:last], numpy.zeros(last-first)).sparse_matrix
+            self.cells = row.indices
+            self.weights = row.data
+            self.box = False
+
+    def sens(self):
+        return numpy.max(numpy.absolute(self.weights))
+
+    def eval(self, x):
+        if self.box:
+            return self.weights * x[self.cells].sum()
+        return self.weights.dot(x.reshape(-1)[self.cells])
+
+    def update(self, h, scale, est, total):
+        """Multiplicative weight update of the cells of h (the estimate is
+        h * scale) towards est, in place. Returns the change in h.sum()."""
+        if self.box:
+            view = h[self.cells]
+            old = view.sum()
+            error = est - scale * self.weights * old # difference between query ans on current estimated data and the observed answer 
+            factor = numpy.exp( self.weights * error / (2.0 * total) )
+            view *= factor
+            return old * factor - old
+        h = h.reshape(-1)
+        old = h[self.cells]
+        error = est - scale * self.weights.dot(old)
+        new = old * numpy.exp( self.weights * error / (2.0 * total) )
+        h[self.cells] = new
+        return new.sum() - old.sum()
 
 '''
 Canonical name:     MWEM (ND)
@@ -126,11 +182,7 @@ class mwemND_engine(mwemND_simple_engine):
 
     def _updateH(self, hatx, estlist):
         """Update using all historical results for multiple rounds"""
-        total = hatx.sum()
-        for c in range(self._updateround):
-            for q, est in estlist:
-                hatx = mwemND_simple_engine._update(hatx,q,est)
-        return hatx
+        return mwemND_simple_engine._sweep(hatx, estlist, self._updateround)
 
     def Run(self, Q, x, epsilon, seed):
         assert seed is not None, 'seed must be set'
@@ -143,27 +195,25 @@ class mwemND_engine(mwemND_simple_engine):
         #Note x is a histogram, type int. hatx is distribution, type float
         hatx.fill( util.old_div(x.sum(), float(x.size)) )
 
-        Q1=list(Q.query_list)# leave Q as it is for future evaluation 
+        remaining = numpy.ones(Q.size, dtype=bool)   # leave Q as it is for future evaluation
 
         selepsilon = epsilon * self._ratio
         queryepsilon = epsilon - selepsilon
         
-        assert(self._nrounds <= len(Q1)) # the maximum possible number of rounds is the size of Q. 
+        assert(self._nrounds <= Q.size) # the maximum possible number of rounds is the size of Q. 
         # selected queries will be removed from Q, added to list of estimated queries
         estQ = []
         nrounds = self._nrounds
         for c in range(nrounds):
-            i = self._exponentialMechanism(x, hatx, Q1, util.old_div(selepsilon, nrounds) ,prng)  # get index of selected query
-            q = Q1[i]
-
-            sens=q.sens()
+            i = self._exponentialMechanism(x, hatx, Q, remaining, util.old_div(selepsilon, nrounds) ,prng)  # get index of selected query
+            q = _Mask(Q, i)    # cells and weights of the query, computed once
 
-            est = q.eval(x) + prng.laplace(0.0, sens * nrounds / queryepsilon, 1)
+            est = q.eval(x) + prng.laplace(0.0, q.sens() * nrounds / queryepsilon)
             estQ.append( (q,est) )
 
             hatx = self._updateH(hatx, estQ)    # update using history 
 
-            del Q1[i]   # no longer a candidate in next round
+            remaining[i] = False   # no longer a candidate in next round
 
 
         return hatx
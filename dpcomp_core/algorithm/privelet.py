@@ -5,6 +5,111 @@ import numpy
 from . import estimate_engine
 import math
 from dpcomp_core import util
+
+
+def _buffer(buf, shape, dtype):
+    """Return a scratch array of the given shape, viewing the flat array buf
+    if one is given (it must hold at least as many elements).
+    """
+    size = int(numpy.prod(shape))
+    if buf is None:
+        return numpy.empty(shape, dtype)
+    assert buf.size >= size and buf.dtype == dtype, 'scratch buffer too small'
+    return buf[:size].reshape(shape)
+
+
+def wave(x, m, buf=None):
+    """Compute the wavelet parameters of an ndarray x, in place.
+
+    m is the number of levels along each of the last len(m) axes, so those
+    axes have sizes 2^m[i]. Any leading axes index independent inputs (e.g.
+    noise trials) and are not transformed. Axes are transformed from the
+    last to the first. buf is an optional flat scratch array of x.size
+    elements, reused for every axis and level.
+    """
+    batch = x.ndim - len(m)
+    for axis in reversed(range(len(m))):
+        y = numpy.moveaxis(x, batch + axis, 0)
+        tmp = _buffer(buf, y.shape, y.dtype)
+        n = y.shape[0]
+        for c in range(m[axis]):
+            half_n = n // 2
+            numpy.add(y[:n:2], y[1:n:2], out=tmp[:half_n])
+            numpy.subtract(y[:n:2], y[1:n:2], out=tmp[half_n:n])
+            y[:n] = tmp[:n]
+            n = half_n
+    return x
+
+
+def dewave(y, m, buf=None):
+    """Compute the original dataset from the wavelet parameters y, in place.
+
+    This inverts wave, undoing the axes in the opposite order. buf is as in
+    wave.
+    """
+    batch = y.ndim - len(m)
+    for axis in range(len(m)):
+        x = numpy.moveaxis(y, batch + axis, 0)
+        tmp = _buffer(buf, x.shape, x.dtype)
+        n = 2
+        half_n = 1
+        for c in range(m[axis]):
+            numpy.add(x[:half_n], x[half_n:n], out=tmp[:n:2])
+            numpy.subtract(x[:half_n], x[half_n:n], out=tmp[1:n:2])
+            numpy.divide(tmp[:n], 2.0, out=x[:n])
+            n *= 2
+            half_n *= 2
+    return y
+
+
+def privelet(x, epsilon, prng, trials=None, buf=None):
+    """Estimate x of any dimension by adding Laplace noise to its wavelet
+    parameters. Each axis is zero padded to the next power of 2.
+
+    If trials is given, that many estimates are computed at once from
+    consecutive draws of prng and stacked along a new leading axis. prng
+    may also be an estimate_engine.BatchRandomState, giving one estimate
+    per seed. buf is an optional flat float scratch array, used by both
+    transforms if it holds all the (batched) coefficients.
+    """
+    m = [int(math.ceil(math.log(n, 2))) for n in x.shape]
+    scale = 1.0
+    for mi in m:
+        scale = scale * (mi + 1.0)
+
+    batch = () if trials is None else (trials,)
+    y = numpy.zeros([2**mi for mi in m])
+    y[tuple(slice(0, n) for n in x.shape)] = x
+    noise = prng.laplace(0.0, scale / epsilon, batch + y.shape)
+    if buf is None or buf.size < noise.size:
+        buf = numpy.empty(noise.size)
+    wave(y, m, buf)
+    y = y + noise
+
+    return dewave(y, m, buf)[(Ellipsis,) + tuple(slice(0, n) for n in x.shape)]
+
+
+class wavelet_engine(estimate_engine.estimate_engine):
+    """Base of the Privelet engines. Keeps the scratch array of its last
+    Run, so repeated runs on the same domain do not allocate a new one.
+    Batched runs use their own, which is freed on return.
+    """
+
+    def _scratch(self, shape):
+        size = 1
+        for n in shape:
+            size *= 2**int(math.ceil(math.log(n, 2)))
+        if getattr(self, '_buf', None) is None or self._buf.size != size:
+            self._buf = numpy.empty(size)
+        return self._buf
+
+    def asDict(self):
+        return util.class_to_dict(self, ignore_list=['_buf'])
+
+    def analysis_payload(self):
+        return util.class_to_dict(self, ignore_list=['_buf'])
+
+
 '''
 Canonical name:     Privelet (1D)
 Additional aliases: -
@@ -12,7 +117,7 @@ Reference:          [ X. Xiao, G. Wang, and J. Gehrke. Differential privacy via
 Invocation:         dpcomp_core.algorithm.privelet.privelet_engine()
 Implementation:     DPComp team
 '''
-class privelet_engine(estimate_engine.estimate_engine):
+class privelet_engine(wavelet_engine):
     """Estimate a dataset by asking its wavelet parameters."""
 
     def __init__(self,short_name ="Privelet"):
@@ -20,36 +125,6 @@ class privelet_engine(estimate_engine.estimate_engine):
         self.short_name = short_name
 
         
-    @staticmethod
-    def _wave(x, m):
-        """Compute the wavelet parameters of dataset x with
-        size 2^m.
-        """
-        y = numpy.array(x)
-        n = len(x)
-        for c in range(m):
-            y[:n] = numpy.hstack([y[:n][0::2] + y[:n][1::2],
-                                  y[:n][0::2] - y[:n][1::2]])
-            n = n // 2
-        return y
-
-    @staticmethod
-    def _dewave(y, m):
-        """Compute the original dataset from a set of wavelet parameters
-        y with size 2^m.
-        """
-        x = numpy.array(y)
-        n = 2
-        half_n = 1
-        for c in range(m):
-            x[:n:2], x[1:n:2] = util.old_div((x[:half_n] + x[half_n:n]),2.0), \
-                                util.old_div((x[:half_n] - x[half_n:n]),2.0)
-            n *= 2
-            half_n *= 2
-
-        return x
-
-
     def Run(self,Q, x, epsilon, seed):
 
         assert seed is not None, 'seed must be set'
@@ -62,10 +137,39 @@ class privelet_engine(estimate_engine.estimate_engine):
             # don't convert to wavelet parameters for small domains
             return x + prng.laplace(0.0, util.old_div(1.0, epsilon), len(x))
         else:
-            m = int(math.ceil(math.log(n, 2)))
-            x1 = numpy.zeros(2**m)
-            x1[:n] = x
-            y1 = privelet_engine._wave(x1, m) + \
-                 prng.laplace(0.0, util.old_div((m+1.0), epsilon), len(x1))
+            return privelet(x, epsilon, prng, buf=self._scratch(x.shape))
+
+    def RunBatch(self, Q, x, epsilon, seeds):
+        prngs = estimate_engine.BatchRandomState(seeds)
+
+        assert len(x.shape)==1, '%s is defined for 1D data only' % self.__class__.__name__
+
+        if len(x) <= 16:
+            return x + prngs.laplace(0.0, util.old_div(1.0, epsilon), len(x))
+        else:
+            return privelet(x, epsilon, prngs)
+
+
+'''
+Canonical name:     Privelet (N-dimensional)
+Additional aliases: -
+Reference:          [ X. Xiao, G. Wang, and J. Gehrke. Differential privacy via wavelet transforms. ICDE, 2010.](http://dl.acm.org/citation.cfm?id=2007020)
+Invocation:         dpcomp_core.algorithm.privelet.priveletND_engine()
+Implementation:     DPComp team
+'''
+class priveletND_engine(wavelet_engine):
+    """Estimate a dataset of any dimension by asking its wavelet parameters."""
+
+    def __init__(self,short_name ="Privelet"):
+        self.init_params = util.init_params_from_locals(locals())
+        self.short_name = short_name
+
+    def Run(self,Q, x, epsilon, seed):
+
+        assert seed is not None, 'seed must be set'
+        prng = numpy.random.RandomState(seed)
+
+        return privelet(x, epsilon, prng, buf=self._scratch(x.shape))
 
-            return privelet_engine._dewave(y1, m)[:n]
+    def RunBatch(self, Q, x, epsilon, seeds):
+        return privelet(x, epsilon, estimate_engine.BatchRandomState(seeds))
@@ -1,6 +1,7 @@
 from __future__ import division
 from __future__ import absolute_import
 from .estimate_engine import estimate_engine
+from .estimate_engine import BatchRandomState
 import numpy
 from dpcomp_core import util
 
@@ -35,3 +36,10 @@ class uniform_noisy_engine(estimate_engine):
 
         m = x.sum() + prng.laplace(0.0, util.old_div(1.0, epsilon), 1)
         return numpy.ones_like(x,dtype=numpy.float32) * m / x.size # assuming m is known
+
+    def RunBatch(self, Q, x, epsilon, seeds):
+        prngs = BatchRandomState(seeds)
+
+        m = x.sum() + prngs.laplace(0.0, util.old_div(1.0, epsilon), 1)
+        m = m.reshape((len(prngs),) + (1,)*x.ndim)
+        return numpy.ones_like(x,dtype=numpy.float32) * m / x.size
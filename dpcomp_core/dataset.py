@@ -78,13 +78,11 @@ class Dataset(Marshallable):
             out = [len(numpy.unique(numpy.compress([True], p_grid, axis=i))) for i in range(p_grid.ndim)]
             out.reverse()   # rows/cols need to be reversed here
             out_shape = tuple(out)
-        #reduce
-        unique, indices, inverse, counts = numpy.unique(p_grid, return_index=True, return_inverse=True, return_counts=True)
-        res = numpy.zeros_like(unique, dtype=float)
-        for index, c in numpy.ndenumerate(data.ravel()):   # needs to be flattened for parallel indexing with output of unique
-            res[ inverse[index] ] += c
-           
-        return numpy.array(res).reshape(out_shape)
+        #reduce: bincount accumulates in ravel order, same as summing cell by cell
+        unique, inverse = numpy.unique(p_grid, return_inverse=True)
+        res = numpy.bincount(inverse.ravel(), weights=data.ravel(), minlength=len(unique))
+
+        return res.reshape(out_shape)
 
 
     def compile(self):
@@ -97,11 +95,10 @@ class Dataset(Marshallable):
             for red, rem in q:
                 assert rem == 0, 'Domain must be reducible to target domain by uniform grid: %i, %i' % (red,rem)
             grid_shape = [r[0] for r in q]
-            p_grid = partition_grid(self._payload.shape, grid_shape)
-            self._payload = self.reduce_data(p_grid,self._payload)  # update payload
+            self._payload = reduce_grid(self._payload, grid_shape)  # update payload
 
             if self._dist is not None:
-                self._dist = self.reduce_data(p_grid,self._dist)  # update dist
+                self._dist = reduce_grid(self._dist, grid_shape)  # update dist
 
         self._compiled = True
         self._payload = self._payload.astype("int") # partition engines need payload to be of type int
@@ -163,45 +160,96 @@ class DatasetFromFile(Dataset):
 
     def __init__(self, nickname, reduce_to_dom_shape=None):
         self.fname = nickname
-        assert nickname in filenameDict, 'Filename parameter not recognized: %s' % nickname
-        hist = load(filenameDict[self.fname])
+        hist = load_hist(self.fname)
         super(DatasetFromFile,self).__init__(hist, reduce_to_dom_shape, None)
 
 
 class DatasetSampled(Dataset):
 
-    def __init__(self, dist, sample_to_scale, reduce_to_dom_shape=None, seed=None):
+    def __init__(self, dist, sample_to_scale, reduce_to_dom_shape=None, seed=None, sampler='choice'):
         self.seed = seed
+        self.sampler = sampler
         prng = numpy.random.RandomState(self.seed)
-        hist = subSample(dist, sample_to_scale, prng)
+        hist = subSample(dist, sample_to_scale, prng, sampler)
         super(DatasetSampled,self).__init__(hist, reduce_to_dom_shape, dist)
 
 
 class DatasetSampledFromFile(DatasetSampled):
 
-    def __init__(self, nickname, sample_to_scale, reduce_to_dom_shape=None, seed=None):
+    def __init__(self, nickname, sample_to_scale, reduce_to_dom_shape=None, seed=None, sampler='choice'):
         self.init_params = util.init_params_from_locals(locals())
 
         self.fname = nickname
-        assert nickname in filenameDict, 'Filename parameter not recognized: %s' % nickname
-        hist = load(filenameDict[self.fname])
+        dist = load_dist(self.fname)
+        super(DatasetSampledFromFile,self).__init__(dist, sample_to_scale, reduce_to_dom_shape, seed, sampler)
+
+
+
+
+# process-wide caches of loaded histograms and their normalized distributions, keyed by nickname
+_hist_cache = {}
+_dist_cache = {}
+
+# user-supplied datasets: nickname -> path or array of counts
+_registry = {}
+
+
+def register(nickname, source):
+    """
+    Make a user-supplied histogram available to DatasetFromFile and DatasetSampledFromFile under nickname.
+    source is either the path of a .npy/.txt file, loaded (memory-mapped for .npy) on first use, or an array of counts.
+    """
+    _registry[nickname] = source
+    _hist_cache.pop(nickname, None)
+    _dist_cache.pop(nickname, None)
+
+
+def load_hist(nickname):
+    """ Return the (read-only) histogram of a built-in or registered dataset, loading it at most once per process """
+    if nickname not in _hist_cache:
+        if nickname in _registry:
+            source = _registry[nickname]
+        else:
+            assert nickname in filenameDict, 'Filename parameter not recognized: %s' % nickname
+            source = filenameDict[nickname]
+
+        if isinstance(source, numpy.ndarray):
+            hist = source.view()
+        else:
+            hist = load(source)
+        hist.setflags(write=False)     # shared by every dataset built from this nickname
+        _hist_cache[nickname] = hist
+
+    return _hist_cache[nickname]
+
+
+def load_dist(nickname):
+    """ Return the (read-only) normalized distribution of a built-in or registered dataset, cached per process """
+    if nickname not in _dist_cache:
+        hist = load_hist(nickname)
         dist = util.old_div(hist, float(hist.sum()))
-        super(DatasetSampledFromFile,self).__init__(dist, sample_to_scale, reduce_to_dom_shape, seed)
+        dist.setflags(write=False)
+        _dist_cache[nickname] = dist
 
+    return _dist_cache[nickname]
 
 
+def data_path():
+    """ Directory holding the bundled datafiles: under $DPCOMP_CORE if set, otherwise next to this module """
+    tryPaths = [os.path.join(os.environ['DPCOMP_CORE'], 'dpcomp_core')] if 'DPCOMP_CORE' in os.environ else []
+    tryPaths.append(os.path.dirname(os.path.abspath(__file__)))
+    path = [p for p in tryPaths if os.path.exists(os.path.join(p, 'datafiles'))]
+    assert path, 'data path not found.'
 
-tryPaths = [os.path.join(os.environ['DPCOMP_CORE'], 'dpcomp_core')]
+    return os.path.join(path[0], 'datafiles')
 
 
 def load(filename):
     """
     Load from file and return original counts (should be integral)
+    Relative filenames are resolved against data_path(); .npy files are memory-mapped read-only
     """
-    path = [p for p in tryPaths if os.path.exists(p)]
-    assert path, 'data path not found.'
-
-    fullpath = os.path.join( path[0], 'datafiles', filename )	# fixed for now, so we don't have to include as a parameter in automated key extraction stuff...
+    fullpath = os.path.join( data_path(), filename ) if not os.path.isabs(filename) else filename
     _, file_extension = os.path.splitext(fullpath)
     if file_extension == '.txt':
         x = []
@@ -210,15 +258,24 @@ def load(filename):
                 x.append(int(ln))
         return numpy.array(x, dtype='int32')
     elif file_extension == '.npy':
-        return numpy.load(fullpath)
+        return numpy.load(fullpath, mmap_mode='r')
     else:
         raise Exception('Unrecognized file extension')
 
 
-def subSample(dist, sampleSize, prng):
-    ''' Generate a subsample of given sampleSize from an input distribution '''
-    samples = prng.choice(a=dist.size, replace=True, size=int(sampleSize), p=dist.flatten())
-    hist = numpy.histogram(samples, bins=dist.size, range=(0,dist.size))[0].astype('int32')		# return only counts (not bins)
+def subSample(dist, sampleSize, prng, sampler='choice'):
+    ''' Generate a subsample of given sampleSize from an input distribution
+        sampler: 'choice' (the default) draws every record and bins them, reproducing datasets sampled under
+                 earlier seeds; 'multinomial' draws the histogram directly, in time and memory linear in the
+                 domain size rather than the sample size, but gives different samples for the same seed
+    '''
+    if sampler == 'multinomial':
+        hist = prng.multinomial(int(sampleSize), dist.flatten()).astype('int32')
+    elif sampler == 'choice':
+        samples = prng.choice(a=dist.size, replace=True, size=int(sampleSize), p=dist.flatten())
+        hist = numpy.histogram(samples, bins=dist.size, range=(0,dist.size))[0].astype('int32')		# return only counts (not bins)
+    else:
+        raise ValueError('Unrecognized sampler: %s' % sampler)
     return hist.reshape( dist.shape )
 
 # partition vector generation for data reduction
@@ -268,21 +325,19 @@ def partition_grid(domain_shape, grid_shape):
 
     assert sum(divmod(d,b)[1] for (d,b) in zip(domain_shape, grid_shape)) == 0, "Domain size along each dimension should be a multiple of size of block"
 
-    def g(*idx):
-        """
-        This function will receive an index tuple from numpy.fromfunction
-        It's behavior depends on grid_shape: take (i,j) and divide by grid_shape (in each dimension)
-        That becomes an identifier of the block; then assign a unique integer to it using pairing.
-        """
-        x = numpy.array(idx)
-        y = numpy.array(grid_shape)
-        return general_pairing( util.old_div(x,y) )  # broadcasting integer division
-
-    h = numpy.vectorize(g)
-
-    # numpy.fromfunction builds an array of domain_shape by calling a function with each index tuple (e.g. (i,j))
-    partition_array = numpy.fromfunction(h, domain_shape, dtype=int)
-    # transform to canonical order 
-    partition_array = canonicalTransform(partition_array)
-    return partition_array
+    # block index of every cell along each dimension, numbered in row-major block order
+    # (the canonical order: first occurrence in a row-major scan of the domain)
+    block_shape = tuple(d // b for (d,b) in zip(domain_shape, grid_shape))
+    blocks = [numpy.arange(d) // b for (d,b) in zip(domain_shape, grid_shape)]
+    return numpy.ravel_multi_index(numpy.ix_(*blocks), block_shape)
 
+def reduce_grid(data, grid_shape):
+    """ Sum data over uniform blocks of grid_shape cells, in any number of dimensions.
+        Gives the same result as Dataset.reduce_data(partition_grid(data.shape, grid_shape), data)
+    """
+    if isinstance(grid_shape, int):
+        grid_shape = (grid_shape,)
+    block_shape = tuple(d // b for (d,b) in zip(data.shape, grid_shape))
+    p_grid = partition_grid(data.shape, grid_shape)
+    res = numpy.bincount(p_grid.ravel(), weights=numpy.ravel(data), minlength=int(numpy.prod(block_shape)))
+    return res.reshape(block_shape)
@@ -3,6 +3,7 @@ from collections import defaultdict
 from dpcomp_core import cartesian_product as cp
 from dpcomp_core import util
 import json
+import multiprocessing
 
 
 class FileWriter(object):
@@ -47,10 +48,39 @@ class ListWriter(object):
 
 
 def process_experiments(params_map, writer, procs=1):
-    for config_hash, params_list in params_map.items():
-        group_metrics = [cp.run(params) for params in params_list]
-
-        writer.write(group_metrics)
+    """Run every params in params_map and write one metric group per config.
+       With procs > 1 (or None for one per cpu) the individual params are
+       fanned out over a process pool. Groups are still written in the
+       iteration order of params_map, each as soon as it is complete.
+    """
+    if procs == 1:
+        for config_hash, params_list in params_map.items():
+            group_metrics = [cp.run(params) for params in params_list]
+
+            writer.write(group_metrics)
+    else:
+        _process_parallel(params_map, writer, procs)
+
+
+def _process_parallel(params_map, writer, procs):
+    groups = list(params_map.values())
+    flat_params = [params for params_list in groups for params in params_list]
+
+    pool = multiprocessing.Pool(procs)
+    try:
+        # imap yields in submission order, so groups come back deterministically
+        results = pool.imap(cp.run, flat_params)
+        for params_list in groups:
+            group_metrics = [next(results) for params in params_list]
+
+            writer.write(group_metrics)
+
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
 
 
 def assemble_experiments(algorithms, datasets, workloads, domains, epsilons, scales, query_sizes, ex_seeds, ds_seeds):
@@ -55,8 +55,8 @@ class SampleError(Metric):
         super(SampleError, self).compute(update_payload)
 
         scale = self.X.scale
-        true_ans = self.W.evaluate(self.X.payload)
-        est_ans = self.W.evaluate(self.X_hat)
+        true_ans = self.W.evaluate_prefix(self.X.payload)
+        est_ans = self.W.evaluate_prefix(self.X_hat)
         diff = true_ans - est_ans
         self.error_payload = calculate_error('TypeI', diff, scale)
 
@@ -73,8 +73,8 @@ class PopulationError(Metric):
         super(PopulationError, self).compute(update_payload)
 
         scale = self.X.scale
-        scaled_dist_ans = self.W.evaluate( self.X.dist * scale )  # scale up distribution and evaluate query answers
-        est_ans = self.W.evaluate(self.X_hat)
+        scaled_dist_ans = self.W.evaluate_prefix( self.X.dist * scale )  # scale up distribution and evaluate query answers
+        est_ans = self.W.evaluate_prefix(self.X_hat)
         diff = scaled_dist_ans - est_ans
         self.error_payload = calculate_error('TypeII', diff, scale)
 
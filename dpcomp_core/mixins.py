@@ -1,23 +1,205 @@
 from builtins import object
+from collections import Counter
+from collections import OrderedDict
 from collections import defaultdict
+import hashlib
+import numpy
+import os
+import pickle
+import sys
+import tempfile
 from dpcomp_core import util
 
 
 class Cache(object):
+    """ In-memory cache of values grouped by label.
+        budgets maps labels to a budget in bytes, other labels get default_budget (None is unbounded).
+        Within a label the least recently used entries are evicted to stay within its budget.
+        Hits, misses and evictions are counted per label, see stats().
+    """
 
-    def __init__(self):
-        self._cache = defaultdict(dict)
+    def __init__(self, budgets=None, default_budget=None):
+        self._cache = defaultdict(OrderedDict)
+        self._bytes = defaultdict(int)
+        self._sizes = defaultdict(dict)
+        self._counters = defaultdict(Counter)
+        self.budgets = dict(budgets or {})
+        self.default_budget = default_budget
 
     def is_present(self, label, key):
-        return key in self._cache[label]
+        present = key in self._cache[label]
+        self._counters[label]['hits' if present else 'misses'] += 1
+
+        return present
 
     def set(self, label, key, value):
+        budget = self.budgets.get(label, self.default_budget)
+        if key in self._cache[label]:
+            self._discard(label, key)
         self._cache[label][key] = value
+        if budget is not None:
+            size = estimate_size(value)
+            self._sizes[label][key] = size
+            self._bytes[label] += size
+            while self._bytes[label] > budget:
+                self._discard(label, next(iter(self._cache[label])))
+                self._counters[label]['evictions'] += 1
+
+        return value
+
+    def get(self, label, key):
+        value = self._cache[label].pop(key)
+        self._cache[label][key] = value   # move to the most recently used end
+
+        return value
+
+    def _discard(self, label, key):
+        del self._cache[label][key]
+        self._bytes[label] -= self._sizes[label].pop(key, 0)
+
+    def stats(self):
+        """ Per-label dict of hits, misses, evictions, current entries and (budgeted labels only) bytes """
+        labels = set(self._cache) | set(self._counters)
+        return dict((label, {'hits': self._counters[label]['hits'],
+                             'misses': self._counters[label]['misses'],
+                             'evictions': self._counters[label]['evictions'],
+                             'entries': len(self._cache[label]),
+                             'bytes': self._bytes[label]}) for label in labels)
+
+
+def estimate_size(value, seen=None):
+    """ Rough size in bytes of value: buffers of numpy arrays plus the objects, containers and
+        instance attributes reachable from it, each counted once
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, numpy.ndarray):
+        size = value.nbytes
+        if value.dtype.hasobject:
+            size += sum(estimate_size(v, seen) for v in value.flat)
+        return size
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for (k, v) in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v, seen) for v in value)
+    elif hasattr(value, '__dict__'):
+        size += estimate_size(vars(value), seen)
+
+    return size
+
+
+class DiskCache(object):
+    """ Persistent, content-addressed cache with the same interface as Cache.
+        Each entry is a file under path named by its label and the sha1 of label and key: numpy arrays are
+        stored as .npy and read back memory-mapped, anything else is pickled. Writes go to a temporary
+        file that is renamed into place, so concurrent processes never see partial entries. When
+        max_bytes is set, least recently used entries are evicted once the cache grows past it.
+    """
+
+    _EXTENSIONS = ('.npy', '.pkl')
+
+    def __init__(self, path, max_bytes=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._counters = defaultdict(Counter)
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+
+    def _base(self, label, key):
+        m = hashlib.sha1()
+        m.update(util.prepare_for_hash(label))
+        m.update(util.prepare_for_hash(key))
+        return os.path.join(self.path, label + '-' + m.hexdigest())
+
+    def _find(self, label, key):
+        base = self._base(label, key)
+        for ext in self._EXTENSIONS:
+            if os.path.exists(base + ext):
+                return base + ext
+        return None
+
+    def is_present(self, label, key):
+        present = self._find(label, key) is not None
+        self._counters[label]['hits' if present else 'misses'] += 1
+
+        return present
+
+    def set(self, label, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            if isinstance(value, numpy.ndarray) and not value.dtype.hasobject:
+                numpy.save(f, value)
+                ext = '.npy'
+            else:
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+                ext = '.pkl'
+        getattr(os, 'replace', os.rename)(tmp, self._base(label, key) + ext)
+        self.evict()
 
         return value
 
     def get(self, label, key):
-        return self._cache[label][key]
+        path = self._find(label, key)
+        if path is None:
+            raise KeyError(key)
+        try:
+            os.utime(path, None)   # mark as recently used
+            if path.endswith('.npy'):
+                return numpy.load(path, mmap_mode='r')
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except OSError:   # evicted by another process since it was found
+            raise KeyError(key)
+
+    def entries(self):
+        """ List of (mtime, size, path) for every entry, least recently used first """
+        entries = []
+        for name in os.listdir(self.path):
+            if os.path.splitext(name)[1] in self._EXTENSIONS:
+                path = os.path.join(self.path, name)
+                try:
+                    st = os.stat(path)
+                except OSError:   # removed by another process
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        total = sum(size for (mtime, size, path) in entries)
+        for (mtime, size, path) in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self._counters[self._label(path)]['evictions'] += 1
+            except OSError:
+                pass
+            total -= size
+
+    def _label(self, path):
+        return os.path.basename(path).rsplit('-', 1)[0]
+
+    def stats(self):
+        """ Per-label dict of hits, misses and evictions seen by this process, with entries and bytes on disk """
+        stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'evictions': 0, 'entries': 0, 'bytes': 0})
+        for (label, counter) in self._counters.items():
+            stats[label].update(counter)
+        for (mtime, size, path) in self.entries():
+            stats[self._label(path)]['entries'] += 1
+            stats[self._label(path)]['bytes'] += size
+        return dict(stats)
 
 
 class Cacheable(object):
@@ -32,10 +214,13 @@ class Cacheable(object):
         label = self.__label_for(obj)
 
         if self._cache.is_present(label, key):
-            _obj = self._cache.get(label, key)
-        else:
-            _obj = getattr(obj, method_name)(*args)
-            self._cache.set(label, key, _obj)
+            try:
+                return self._cache.get(label, key)
+            except KeyError:   # a shared cache may drop the entry in between
+                pass
+
+        _obj = getattr(obj, method_name)(*args)
+        self._cache.set(label, key, _obj)
 
         return _obj
 
@@ -58,6 +243,16 @@ class Cacheable(object):
     def __label_for(self, obj):
         return obj.__class__.__name__
 
+    @staticmethod
+    def set_cache(cache):
+        """Use cache (e.g. a DiskCache) as the backend shared by all Cacheable objects."""
+        Cacheable._cache = cache
+
+    @staticmethod
+    def cache_stats():
+        """Per-label hit/miss/eviction counters of the current cache backend."""
+        return Cacheable._cache.stats()
+
     @staticmethod
     def reset():
         Cacheable._cache = Cache()
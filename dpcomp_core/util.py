@@ -23,6 +23,60 @@ def old_div(x, y):
         return past.utils.old_div(x, y)
 
 
+def summed_area_table(x):
+    """ N-dimensional summed-area table of x, zero padded at the front of every axis:
+        sat[i_1,...,i_d] is the sum of x over the box [0,i_1) x ... x [0,i_d)
+    """
+    x = np.asarray(x)
+    dtype = np.int64 if x.dtype.kind in 'biu' else np.float64   # exact for counts
+    sat = np.zeros([s + 1 for s in x.shape], dtype=dtype)
+    sat[tuple(slice(1, None) for s in x.shape)] = x
+    for axis in range(x.ndim):
+        np.cumsum(sat, axis=axis, out=sat)
+    return sat
+
+
+def box_sums(sat, lb, ub):
+    """ Sums of the boxes [lb, ub] (inclusive, one box per row) by inclusion-exclusion over the
+        2^d corners of each box in the summed-area table sat
+    """
+    lb, ub = np.atleast_2d(lb), np.atleast_2d(ub) + 1
+    d = lb.shape[1]
+    total = np.zeros(lb.shape[0], dtype=sat.dtype)
+    for corner in range(2 ** d):
+        upper = np.array([(corner >> i) & 1 for i in range(d)], dtype=bool)
+        idx = np.where(upper, ub, lb)
+        if (d - upper.sum()) % 2 == 0:
+            total += sat[tuple(idx.T)]
+        else:
+            total -= sat[tuple(idx.T)]
+    return total
+
+
+def grid_bounds(n, grid):
+    """ Inclusive lower and upper bound arrays of the cells of a uniform grid of width grid over range(n);
+        the last cell is clipped at n-1
+    """
+    lb = np.arange(0, n, grid)
+    return lb, np.minimum(lb + grid - 1, n - 1)
+
+
+def grid_counts(sat, rows, cols, origin=(0, 0)):
+    """ Sums of every cell of the 2D grid rows x cols (each a pair of bound arrays from grid_bounds,
+        relative to origin) looked up in the summed-area table sat, as a len(rows) x len(cols) array
+    """
+    (r0, r1), (c0, c1) = rows, cols
+    r0, r1 = origin[0] + r0, origin[0] + r1 + 1
+    c0, c1 = origin[1] + c0, origin[1] + c1 + 1
+    return sat[np.ix_(r1, c1)] - sat[np.ix_(r0, c1)] - sat[np.ix_(r1, c0)] + sat[np.ix_(r0, c0)]
+
+
+def fill_grid(values, rows, cols):
+    """ Expand per-cell values of the 2D grid rows x cols to the cells' full extent """
+    (r0, r1), (c0, c1) = rows, cols
+    return np.repeat(np.repeat(values, r1 - r0 + 1, axis=0), c1 - c0 + 1, axis=1)
+
+
 def class_to_dict(inst, ignore_list=[], attr_prefix=''):
     """ Writes state of class instance as a dict
         Includes both attributes and properties (i.e. those methods labeled with @property)
@@ -33,7 +87,7 @@ def class_to_dict(inst, ignore_list=[], attr_prefix=''):
     """
     output = vars(inst).copy()  # captures regular variables
     cls = type(inst)  # class of instance
-    properties = [p for p in dir(cls) if isinstance(getattr(cls, p), property)]
+    properties = [p for p in dir(cls) if isinstance(getattr(cls, p), property) and p not in ignore_list]
     for p in properties:
         prop = getattr(cls, p)  # get property object by name
         output[p] = prop.fget(inst)  # call its fget
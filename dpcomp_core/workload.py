@@ -5,6 +5,8 @@ import copy
 import hashlib
 import itertools
 import numpy
+import scipy.sparse
+import scipy.sparse.linalg
 from dpcomp_core.mixins import Marshallable
 from dpcomp_core.query_nd_union import ndRangeUnion
 from dpcomp_core import util
@@ -20,35 +22,135 @@ class Workload(Marshallable):
         """ Basic constructor takes list of ndQuery instances and a domain shape
         """
         self.domain_shape = domain_shape
-        self.query_list = query_list
+        self._query_list = query_list
         self._matrix = None
+        self._sparse_matrix = None
+        self._range_arrays = None
         self._compiled = False
 
+    @classmethod
+    def from_ranges(cls, lb, ub, domain_shape, wgt=None, qid=None):
+        """ Array-backed workload: lb and ub are m x d arrays of inclusive corners, wgt the range weights
+            and qid the (non-decreasing) query index of each range; by default every range is its own query
+        """
+        W = Workload(None, domain_shape)
+        W._set_ranges(lb, ub, wgt, qid)
+        return W
+
+    def _set_ranges(self, lb, ub, wgt=None, qid=None):
+        d = len(self.domain_shape)
+        lb = numpy.asarray(lb, dtype=int).reshape(-1, d)
+        ub = numpy.asarray(ub, dtype=int).reshape(-1, d)
+        assert lb.shape == ub.shape, 'Dimensions of upper and lower corners must match.'
+        assert (lb <= ub).all(), 'Lower corner must be <= upper corner'
+        wgt = numpy.ones(len(lb)) if wgt is None else numpy.broadcast_to(numpy.asarray(wgt, dtype=float), (len(lb),)).copy()
+        qid = numpy.arange(len(lb)) if qid is None else numpy.asarray(qid, dtype=int)
+        self._range_arrays = (lb, ub, wgt, qid)
+
+    @property
+    def query_list(self):
+        """ List of ndRangeUnion queries, built from the range arrays on first access if array-backed """
+        if self._query_list is None:
+            lb, ub, wgt, qid = self._range_arrays
+            queries = [ndRangeUnion() for i in range(self.size)]
+            for (i, l, u, w) in zip(qid.tolist(), lb.tolist(), ub.tolist(), wgt.tolist()):
+                queries[i].addRange(tuple(l), tuple(u), w)
+            self._query_list = queries
+        return self._query_list
+
     def compile(self):
         if not self._compiled:
-            self.compute_matrix() 
+            self.compute_sparse_matrix()
             self._compiled = True
 
         return self
 
     @property
     def matrix(self):
-        return self.compile()._matrix
+        """ Dense m x n workload matrix, materialized on first access """
+        if self._matrix is None:
+            self._matrix = self.sparse_matrix.toarray()
+        return self._matrix
+
+    @property
+    def sparse_matrix(self):
+        return self.compile()._sparse_matrix
 
     @property
     def size(self):
-        return len(self.query_list)
+        if self._query_list is None:
+            qid = self._range_arrays[3]
+            return int(qid[-1]) + 1 if qid.size else 0
+        return len(self._query_list)
 
     def compute_matrix(self):
-        rows = [r.asArray(self.domain_shape).flatten() for r in self.query_list]
-        n = rows[0].size
-        m = len(rows)
-        self._matrix = numpy.empty(shape=(m,n))
+        self._matrix = self.sparse_matrix.toarray()
+        return self._matrix
+
+    def compute_sparse_matrix(self):
+        """ Build the m x n workload matrix in CSR form, touching only the cells covered by each range.
+            Queries are expanded in blocks of about _CSR_BLOCK cells, written straight into the
+            final int32 index and float data arrays, so the peak is the matrix plus one block
+        """
+        lb, ub, wgt, qid = self.range_arrays()
+        shape = numpy.array(self.domain_shape, dtype=int)
+        assert lb.shape[1] == len(shape), 'Number of dimensions differ: shape is: %s' % (self.domain_shape,)
+        assert (lb >= 0).all() and (ub < shape).all(), 'Range out of bounds for domain %s' % (self.domain_shape,)
+
+        m, n = self.size, int(numpy.prod(shape))
+        cells = numpy.prod(ub - lb + 1, axis=1)
+        starts = numpy.searchsorted(qid, numpy.arange(m + 1))          # first range of every query
+        covered = numpy.concatenate([[0], numpy.cumsum(cells)])[starts]  # cells before every query
+        index = numpy.int32 if max(n, covered[-1]) < 2**31 else numpy.int64
+        indptr = numpy.zeros(m + 1, dtype=index)
+        indices = numpy.empty(covered[-1], dtype=index)
+        data = numpy.empty(covered[-1])
+
+        nnz, q0 = 0, 0
+        while q0 < m:
+            q1 = max(q0 + 1, numpy.searchsorted(covered, covered[q0] + _CSR_BLOCK, side='right') - 1)
+            (r0, r1) = (starts[q0], starts[q1])
+            k, cols = _box_cells(lb[r0:r1], ub[r0:r1], shape)
+            # overlapping ranges within a union are summed, matching ndRangeUnion.asArray
+            block = scipy.sparse.csr_matrix((wgt[r0:r1][k], (qid[r0:r1][k] - q0, cols)), shape=(q1 - q0, n))
+            indices[nnz:nnz + block.nnz] = block.indices
+            data[nnz:nnz + block.nnz] = block.data
+            indptr[q0 + 1:q1 + 1] = nnz + block.indptr[1:]
+            nnz += block.nnz
+            q0 = q1
+
+        self._sparse_matrix = scipy.sparse.csr_matrix((data[:nnz], indices[:nnz], indptr), shape=(m, n))
+        return self._sparse_matrix
 
-        for (i,row) in enumerate(rows):
-            self._matrix[i,:] = row
+    @property
+    def operator(self):
+        """ The workload matrix as an implicit scipy LinearOperator: dot evaluates every range on a
+            summed-area table and T.dot scatters into a difference array, both in O(m 2^d + n)
+        """
+        return _RangeOperator(self)
 
-        return self._matrix
+    def range_arrays(self):
+        """ Flatten the ranges of all queries into arrays lb (k x d), ub (k x d), wgt (k) and
+            qid (k), the index of the query each range belongs to
+        """
+        if self._range_arrays is None:
+            d = len(self.domain_shape)
+            ranges = [(i, r) for (i, q) in enumerate(self.query_list) for r in q.ranges]
+            lb = numpy.array([r.lb for (i, r) in ranges], dtype=int).reshape(-1, d)
+            ub = numpy.array([r.ub for (i, r) in ranges], dtype=int).reshape(-1, d)
+            wgt = numpy.array([r.wgt for (i, r) in ranges], dtype=float)
+            qid = numpy.array([i for (i, r) in ranges], dtype=int)
+            self._range_arrays = (lb, ub, wgt, qid)
+
+        return self._range_arrays
+
+    def evaluate_prefix(self, x):
+        """ Evaluate the workload on x with a summed-area table: one O(n) pass over x,
+            then O(2^d) lookups per range
+        """
+        lb, ub, wgt, qid = self.range_arrays()
+        sat = util.summed_area_table(numpy.reshape(x, self.domain_shape))
+        return numpy.bincount(qid, weights=wgt * util.box_sums(sat, lb, ub), minlength=self.size)
 
     def sensitivity(self):
         # copied from utilities.py
@@ -59,12 +161,26 @@ class Workload(Marshallable):
             array += q.asArray(maxShape)
         return numpy.max(array)
 
+    def evaluate_adjoint(self, y):
+        """ A^T y for the workload matrix A: every range adds wgt * y[qid] to its box, through the
+            2^d corners of a difference array that is then summed along every axis
+        """
+        lb, ub, wgt, qid = self.range_arrays()
+        return _scatter_boxes(lb, ub, wgt * numpy.ravel(y)[qid], self.domain_shape).ravel()
+
     def sensitivity_from_matrix(self):
         """Return the L1 sensitivity of input matrix A: maximum L1 norm of the columns."""
-        return float(numpy.linalg.norm(self.matrix, 1))   # implemented in numpy as 1-norm of matrix
+        lb, ub, wgt, qid = self.range_arrays()
+        if len(wgt) == 0:
+            return 0.0
+        # |A_ij| adds up over the ranges of a query unless ranges of opposite sign overlap
+        mixed = (numpy.bincount(qid, wgt > 0) > 0) & (numpy.bincount(qid, wgt < 0) > 0)
+        if mixed.any():
+            return float(abs(self.sparse_matrix).sum(axis=0).max())
+        return float(_scatter_boxes(lb, ub, numpy.absolute(wgt), self.domain_shape).max())
 
     def evaluate(self, x):
-        return numpy.dot(self.matrix, x.ravel())
+        return self.evaluate_prefix(x)
 
     @property
     def key(self):
@@ -72,11 +188,71 @@ class Workload(Marshallable):
         return self.hash[:8]
 
     def asDict(self):
-        d = util.class_to_dict(self, ignore_list=['matrix','_matrix','query_list', '_compiled'])
+        d = util.class_to_dict(self, ignore_list=['matrix','_matrix','sparse_matrix','_sparse_matrix','_range_arrays','query_list','_query_list', '_compiled'])
         return d
 
     def analysis_payload(self):
-        return util.class_to_dict(self, ignore_list=['matrix','_matrix','query_list', '_compiled'])
+        return util.class_to_dict(self, ignore_list=['matrix','_matrix','sparse_matrix','_sparse_matrix','_range_arrays','query_list','_query_list', '_compiled'])
+
+# number of cells expanded at once when building the CSR matrix
+_CSR_BLOCK = 2**20
+
+
+class _RangeOperator(scipy.sparse.linalg.LinearOperator):
+    """ Workload.operator, or its transpose """
+
+    def __init__(self, W, transposed=False):
+        self.W = W
+        self.transposed = transposed
+        shape = (W.size, int(numpy.prod(W.domain_shape)))
+        super(_RangeOperator, self).__init__(float, shape[::-1] if transposed else shape)
+
+    def _matvec(self, x):
+        return self.W.evaluate_adjoint(x) if self.transposed else self.W.evaluate_prefix(x)
+
+    def _rmatvec(self, y):
+        return self.W.evaluate_prefix(y) if self.transposed else self.W.evaluate_adjoint(y)
+
+    def _transpose(self):
+        return _RangeOperator(self.W, not self.transposed)
+
+    _adjoint = _transpose
+
+
+def _box_cells(lb, ub, shape):
+    """ Enumerate the cells of every box lb..ub in row-major order without a python loop over boxes.
+        Returns the box index and the flat (int32 where possible) domain index of every cell
+    """
+    extent = ub - lb + 1
+    cells = numpy.prod(extent, axis=1)
+    index = numpy.int32 if numpy.prod(shape) < 2**31 else numpy.int64
+    k = numpy.repeat(numpy.arange(len(cells), dtype=index), cells)
+    t = numpy.arange(k.size, dtype=index) - numpy.repeat((numpy.cumsum(cells) - cells).astype(index), cells)
+    cols = numpy.zeros(k.size, dtype=index)
+    stride = 1
+    for axis in reversed(range(len(shape))):
+        e = extent[k, axis].astype(index)
+        cols += (lb[k, axis].astype(index) + t % e) * stride
+        t //= e
+        stride *= int(shape[axis])
+    return k, cols
+
+
+def _scatter_boxes(lb, ub, values, shape):
+    """ Dense array of the given shape holding, in every cell, the sum of values over the boxes
+        lb..ub (one per row) that cover it
+    """
+    d = len(shape)
+    diff = numpy.zeros([s + 1 for s in shape])
+    for corner in range(2 ** d):
+        upper = numpy.array([(corner >> i) & 1 for i in range(d)], dtype=bool)
+        idx = numpy.where(upper, ub + 1, lb)
+        sign = -1.0 if upper.sum() % 2 else 1.0
+        numpy.add.at(diff, tuple(idx.T), sign * values)
+    for axis in range(d):
+        numpy.cumsum(diff, axis=axis, out=diff)
+    return diff[tuple(slice(0, s) for s in shape)]
+
 
 class Identity(Workload):
     """ Identity workload for in k-dimensional domain """
@@ -85,9 +261,9 @@ class Identity(Workload):
         self.weight = weight
         self.pretty_name = pretty_name
 
-        indexes = itertools.product(*[list(range(i)) for i in domain_shape])   # generate index tuples
-        queries = [ndRangeUnion().addRange(i,i,weight) for i in indexes]
-        super(self.__class__,self).__init__(queries, domain_shape)
+        cells = numpy.indices(domain_shape).reshape(len(domain_shape), -1).T   # index tuples in row-major order
+        super(self.__class__,self).__init__(None, domain_shape)
+        self._set_ranges(cells, cells, weight)
 
     @classmethod
     def oneD(cls, domain_shape_int, weight=1.0):
@@ -112,8 +288,8 @@ class Prefix1D(Workload):
 
         self.pretty_name = pretty_name
 
-        queries = [ndRangeUnion().add1DRange(0, c, 1.0) for c in range(domain_shape_int)]
-        super(self.__class__,self).__init__(queries, (domain_shape_int,))
+        super(self.__class__,self).__init__(None, (domain_shape_int,))
+        self._set_ranges(numpy.zeros(domain_shape_int), numpy.arange(domain_shape_int))
 
     def __repr__(self):
         r = self.__class__.__name__ + '('
@@ -145,16 +321,11 @@ class RandomRange(Workload):
         self._size = size
 
         prng = numpy.random.RandomState(seed)
-        if shape_list == None:
-            shapes = randomQueryShapes(domain_shape, prng)
-        else:
+        if shape_list != None:
             prng.shuffle(self.shape_list)
-            shapes = itertools.cycle(self.shape_list) # infinite iterable over shapes in shape_list
-        queries = []
-        for i in range(size):
-            lb, ub = placeRandomly(next(shapes), domain_shape, prng)       # seed must be None or repeats
-            queries.append( ndRangeUnion().addRange(lb,ub,1.0) )
-        super(RandomRange,self).__init__(queries, domain_shape)
+        lb, ub = randomRanges(self.shape_list, domain_shape, size, prng)
+        super(RandomRange,self).__init__(None, domain_shape)
+        self._set_ranges(lb, ub)
 
     @property
     def hash(self):
@@ -196,3 +367,106 @@ def placeRandomly(query_shape, domain_shape, prng=None):
         lb.append(lower)
         ub.append(lower + query_shape[i] - 1)
     return tuple(lb), tuple(ub)
+
+
+def randomRanges(shape_list, domain_shape, size, prng):
+    ''' Draw size queries in bulk, shaped by randomQueryShapes (shape_list is None) or by cycling
+        through shape_list, and placed as by placeRandomly.
+        Consumes exactly the same stream from prng as the one-query-at-a-time loop, so results are
+        identical for a given seed. Returns lb and ub arrays of shape (size, d)
+    '''
+    d = len(domain_shape)
+    dom = numpy.array(domain_shape, dtype=numpy.int64)
+    assert (dom <= 2**32).all(), 'Domain too large for 32 bit draws'
+    if shape_list is not None:
+        shapes = numpy.array(shape_list, dtype=numpy.int64).reshape(-1, d)
+        cycles = -(-size // len(shapes))
+        if len(shapes) > cycles:        # too few repeats for the cycle map to pay off
+            shapes = itertools.cycle(shape_list)
+            ranges = [placeRandomly(next(shapes), domain_shape, prng) for i in range(size)]
+            lb = numpy.array([r[0] for r in ranges], dtype=int).reshape(-1, d)
+            ub = numpy.array([r[1] for r in ranges], dtype=int).reshape(-1, d)
+            return lb, ub
+    if size == 0:
+        return numpy.zeros((0, d), dtype=int), numpy.zeros((0, d), dtype=int)
+
+    state = prng.get_state()
+    block = 4 * size * d + 1024   # a masked draw consumes fewer than 2 words on average
+    while True:
+        raw = prng.randint(0, 2**32, size=block, dtype=numpy.uint32).astype(numpy.int64)
+        if shape_list is None:
+            step = _queryDraws(raw, numpy.arange(block + 1), dom)[2]
+            starts = _orbit(step, 0, size + 1)
+            shape, lower, _ = _queryDraws(raw, starts[:-1], dom)
+            end = starts[-1]
+        else:
+            step = numpy.arange(block + 1)
+            for query_shape in shapes:
+                step = _placeDraws(raw, step, dom, query_shape)[1]
+            pos = _orbit(step, 0, cycles)
+            lower = numpy.empty((cycles, len(shapes), d), dtype=numpy.int64)
+            after = numpy.empty((cycles, len(shapes)), dtype=numpy.int64)
+            for (l, query_shape) in enumerate(shapes):
+                lower[:, l, :], pos = _placeDraws(raw, pos, dom, query_shape)
+                after[:, l] = pos
+            lower = lower.reshape(-1, d)[:size]
+            shape = shapes[numpy.arange(size) % len(shapes)]
+            end = after.ravel()[size - 1]
+        prng.set_state(state)
+        if end < block:
+            break
+        block *= 2
+
+    prng.randint(0, 2**32, size=end, dtype=numpy.uint32)   # advance prng past the consumed words
+    lb = lower.astype(int)
+    return lb, lb + shape - 1
+
+
+def _maskedDraws(raw, pos, rng):
+    ''' Replay numpy's legacy bounded randint (masked rejection sampling on 32 bit words) for draws in
+        [0, rng] starting at word positions pos of raw. Returns the values and the next positions;
+        position raw.size marks an exhausted block
+    '''
+    end = raw.size
+    rng = numpy.broadcast_to(rng, pos.shape).astype(numpy.int64)
+    mask = rng.copy()
+    for shift in (1, 2, 4, 8, 16):
+        mask |= mask >> shift
+    cur = pos.copy()
+    live = (rng > 0) & (cur < end)     # a draw with rng 0 consumes nothing
+    while live.any():
+        i = numpy.flatnonzero(live)
+        rejected = (raw[cur[i]] & mask[i]) > rng[i]
+        cur[i[rejected]] += 1
+        live[i[~rejected]] = False
+        live[i[rejected]] = cur[i[rejected]] < end
+    values = numpy.where(cur < end, raw[numpy.minimum(cur, end - 1)] & mask, 0)
+    return values, numpy.where(rng > 0, numpy.minimum(cur + 1, end), pos)
+
+
+def _placeDraws(raw, pos, dom, query_shape):
+    ''' Draws of placeRandomly for one query shape, from every position in pos '''
+    lower = numpy.empty(pos.shape + (len(dom),), dtype=numpy.int64)
+    for i in range(len(dom)):
+        lower[..., i], pos = _maskedDraws(raw, pos, dom[i] - query_shape[i])
+    return lower, pos
+
+
+def _queryDraws(raw, pos, dom):
+    ''' Draws of randomQueryShapes followed by placeRandomly, from every position in pos '''
+    shape = numpy.empty(pos.shape + (len(dom),), dtype=numpy.int64)
+    for i in range(len(dom)):
+        values, pos = _maskedDraws(raw, pos, dom[i] - 1)
+        shape[..., i] = values + 1
+    lower, pos = _placeDraws(raw, pos, dom, shape.T)
+    return shape, lower, pos
+
+
+def _orbit(step, start, count):
+    ''' The first count positions start, step[start], step[step[start]], ... by repeated doubling '''
+    orbit = numpy.array([start])
+    jump = step
+    while orbit.size < count:
+        orbit = numpy.concatenate([orbit, jump[orbit]])
+        jump = jump[jump]
+    return orbit[:count]
@@ -0,0 +1,31 @@
+from __future__ import division
+from __future__ import print_function
+from dpcomp_core.algorithm.dawa.cutils import cutil
+from dpcomp_core.algorithm.dawa.cutils import pycutil
+import numpy as np
+import time
+'''
+Times the C++ L1 partition kernels of DAWA against the NumPy versions used
+when the extension is not built, and checks that both give the same
+partition. Requires the extension (see dpcomp_core/algorithm/dawa/setup.sh).
+'''
+
+epsilon = 0.1
+ratio = 0.25
+seed = 7
+cases = [('L1partition', 256), ('L1partition', 1024),
+         ('L1partition_approx', 4096), ('L1partition_approx', 65536)]
+
+prng = np.random.RandomState(0)
+for (name, n) in cases:
+    x = prng.zipf(1.5, n).clip(0, 10000).astype(float)
+    times, hists = [], []
+    for impl in [cutil, pycutil]:
+        t0 = time.time()
+        hists.append(getattr(impl, name)(n+1, x, epsilon, ratio, seed))
+        times.append(time.time() - t0)
+
+    # the boundaries run from n down to 0, entries after that are not set
+    end = list(hists[0][1:]).index(0) + 2
+    same = (hists[0][:end] == hists[1][:end]).all()
+    print('%-20s n=%-6d C++ %.3fs  NumPy %.3fs  same partition: %s' % (name, n, times[0], times[1], same))
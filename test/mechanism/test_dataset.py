@@ -5,6 +5,9 @@ from __future__ import print_function
 
 from builtins import range
 import numpy
+import os
+import shutil
+import tempfile
 from dpcomp_core import dataset
 from dpcomp_core import util
 import unittest
@@ -40,9 +43,60 @@ class DatasetTests(unittest.TestCase):
         self.X2 = dataset.DatasetSampledFromFile(nickname='SF-CABS-S', sample_to_scale=1000, reduce_to_dom_shape = (32,32),  seed=111)
 
 
+    def testReduceGrid(self):
+        x = numpy.random.RandomState(0).rand(12, 8)
+        p_grid = dataset.partition_grid((12, 8), (3, 2))
+        self.assertTrue(numpy.array_equal(dataset.reduce_grid(x, (3, 2)), self.d.reduce_data(p_grid, x)))
+
+        y = numpy.arange(4 * 6 * 8).reshape((4, 6, 8))
+        expected = y.reshape((2, 2, 3, 2, 2, 4)).sum(axis=(1, 3, 5))
+        self.assertTrue(numpy.array_equal(dataset.reduce_grid(y, (2, 2, 4)), expected))
+
     def testDatasetSampled(self):
         print(self.ds.asDict())
 
+    def testSamplers(self):
+        fast = dataset.DatasetSampled(self.dist, 1E5, None, 1001, sampler='multinomial')
+        self.assertEqual(fast.scale, 1E5)
+        self.assertEqual(fast.payload.shape, self.dist.shape)
+
+        legacy = dataset.DatasetSampled(self.dist, 1E5, None, 1001, sampler='choice')
+        samples = numpy.random.RandomState(1001).choice(a=self.dist.size, replace=True, size=100000, p=self.dist)
+        self.assertTrue(numpy.array_equal(legacy.payload, numpy.bincount(samples, minlength=self.dist.size)))
+
+        self.assertRaises(ValueError, dataset.DatasetSampled, self.dist, 1E5, None, 1001, 'unknown')
+
+        # the default reproduces the samples of earlier versions
+        default = dataset.DatasetSampled(self.dist, 1E5, None, 1001)
+        self.assertTrue(numpy.array_equal(default.payload, legacy.payload))
+        self.assertEqual(default.sampler, 'choice')
+
+    def testLoadCache(self):
+        self.assertIs(dataset.load_hist('HEPTH'), dataset.load_hist('HEPTH'))
+        self.assertIsInstance(dataset.load_hist('HEPTH'), numpy.memmap)
+        dist = dataset.load_dist('HEPTH')
+        self.assertIs(dist, dataset.load_dist('HEPTH'))
+        self.assertFalse(dist.flags.writeable)
+        self.assertAlmostEqual(dist.sum(), 1.0)
+
+    def testRegister(self):
+        hist = numpy.arange(64).reshape((8, 8))
+        path = os.path.join(tempfile.mkdtemp(), 'custom.npy')
+        numpy.save(path, hist)
+        try:
+            dataset.register('CUSTOM-ARRAY', hist)
+            dataset.register('CUSTOM-FILE', path)
+            for name in ['CUSTOM-ARRAY', 'CUSTOM-FILE']:
+                self.assertTrue(numpy.array_equal(dataset.DatasetFromFile(name).payload, hist))
+                D = dataset.DatasetSampledFromFile(name, 1E3, reduce_to_dom_shape=(4, 4), seed=0)
+                self.assertEqual(D.payload.shape, (4, 4))
+        finally:
+            for name in ['CUSTOM-ARRAY', 'CUSTOM-FILE']:
+                dataset._registry.pop(name, None)
+                dataset._hist_cache.pop(name, None)
+                dataset._dist_cache.pop(name, None)
+            shutil.rmtree(os.path.dirname(path))
+
     def testZero(self):
         ''' Sampled data has zero counts in buckets that were originally zero '''
         for name in dnames:
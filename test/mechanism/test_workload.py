@@ -1,6 +1,9 @@
 from builtins import range
+import itertools
 import numpy
 from dpcomp_core.workload import *
+from dpcomp_core import workload as workload_module
+from dpcomp_core.query_nd_union import ndRangeUnion
 import unittest
 
 
@@ -55,6 +58,80 @@ class WorkloadTests(unittest.TestCase):
         self.assertEqual(P.hash, PP.hash)
 
 
+    def testSparseMatrix(self):
+        q = ndRangeUnion().addRange((0,0), (3,3), 1.0).addRange((2,2), (5,4), 2.0)   # overlapping union
+        W = Workload([q] + RandomRange(None, self.twoD, 50).query_list, self.twoD)
+
+        dense = numpy.array([r.asArray(self.twoD).flatten() for r in W.query_list])
+        self.assertTrue(numpy.array_equal(W.sparse_matrix.toarray(), dense))
+        self.assertTrue(numpy.array_equal(W.matrix, dense))
+        self.assertEqual(W.sensitivity_from_matrix(), float(numpy.linalg.norm(dense, 1)))
+
+        x = self.x_range.reshape(self.twoD)
+        self.assertTrue(numpy.allclose(W.evaluate(x), [r.eval(x) for r in W.query_list]))
+
+    def testOperator(self):
+        q = ndRangeUnion().addRange((0,0), (3,3), 1.0).addRange((2,2), (5,4), 2.0)
+        W = Workload([q] + RandomRange(None, self.twoD, 50).query_list, self.twoD)
+        dense = numpy.array([r.asArray(self.twoD).flatten() for r in W.query_list])
+
+        x = numpy.random.RandomState(0).rand(dense.shape[1])
+        y = numpy.random.RandomState(1).rand(dense.shape[0])
+        self.assertTrue(numpy.allclose(W.operator.dot(x), dense.dot(x)))
+        self.assertTrue(numpy.allclose(W.operator.T.dot(y), dense.T.dot(y)))
+        self.assertEqual(W.sensitivity_from_matrix(), float(numpy.linalg.norm(dense, 1)))
+        self.assertIsNone(W._sparse_matrix)   # none of the above builds the matrix
+
+        # ranges of opposite sign overlapping within a query partly cancel
+        q = ndRangeUnion().addRange((0,0), (3,3), 1.0).addRange((2,2), (5,4), -2.0)
+        W = Workload([q], self.twoD)
+        self.assertEqual(W.sensitivity_from_matrix(), float(numpy.linalg.norm(q.asArray(self.twoD).reshape(1, -1), 1)))
+
+    def testSparseMatrixBlocks(self):
+        W = RandomRange(None, self.twoD, 200)
+        expected = numpy.array([r.asArray(self.twoD).flatten() for r in W.query_list])
+        block, workload_module._CSR_BLOCK = workload_module._CSR_BLOCK, 100
+        try:
+            M = W.compute_sparse_matrix()
+        finally:
+            workload_module._CSR_BLOCK = block
+        self.assertEqual(M.indices.dtype, numpy.int32)
+        self.assertTrue(numpy.array_equal(M.toarray(), expected))
+
+    def testEvaluatePrefix(self):
+        q = ndRangeUnion().addRange((0,0), (3,3), 1.0).addRange((2,2), (5,4), 2.0)
+        W = Workload([q] + RandomRange(None, self.twoD, 50).query_list, self.twoD)
+        for x in self.X:
+            self.assertTrue(numpy.array_equal(W.evaluate_prefix(x), W.evaluate(x)))
+
+        P = Prefix1D(self.oneDint)
+        x = numpy.random.RandomState(0).rand(self.oneDint)
+        self.assertTrue(numpy.allclose(P.evaluate_prefix(x), numpy.cumsum(x)))
+
+    def testRandomRangeStream(self):
+        for shape_list, domain in [(None, self.twoD), (None, self.oneD), ([(1,), (10,), (100,)], self.oneD)]:
+            prng1 = numpy.random.RandomState(17)
+            prng2 = numpy.random.RandomState(17)
+            lb, ub = randomRanges(shape_list, domain, 300, prng1)
+
+            shapes = randomQueryShapes(domain, prng2) if shape_list is None else itertools.cycle(shape_list)
+            expected = [placeRandomly(next(shapes), domain, prng2) for i in range(300)]
+            self.assertEqual([(tuple(l), tuple(u)) for l, u in zip(lb.tolist(), ub.tolist())], expected)
+            self.assertEqual(prng1.randint(2**30), prng2.randint(2**30))   # same amount of stream consumed
+
+    def testFromRanges(self):
+        W = RandomRange(None, self.twoD, 20)
+        lb, ub, wgt, qid = W.range_arrays()
+        V = Workload.from_ranges(lb, ub, self.twoD)
+        self.assertEqual(V.size, 20)
+        self.assertEqual([q.ranges for q in V.query_list], [q.ranges for q in W.query_list])
+        self.assertTrue(numpy.array_equal(V.matrix, W.matrix))
+
+    def testDictSkipsDenseMatrix(self):
+        W = RandomRange(None, self.twoD, 10).compile()
+        W.asDict()
+        self.assertIsNone(W._matrix)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
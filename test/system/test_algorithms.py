@@ -5,6 +5,7 @@ from dpcomp_core import workload
 from dpcomp_core.algorithm import *
 
 from test import TestCommon
+import numpy as np
 import unittest
 
 
@@ -276,6 +277,22 @@ class TestAlgorithm(TestCommon):
         self.assertEqual(self.expr_seed, E_dict['seed'])
         self.assertEqual(self.expr_eps, E_dict['epsilon'])
 
+    def test_run_batch(self):
+        seeds = [self.expr_seed, 1]
+        for (A, X, W) in [(identity.identity_engine(), self.X2, self.W2),
+                          (uniform.uniform_noisy_engine(), self.X2, self.W2),
+                          (privelet.privelet_engine(), self.X1, self.W1),
+                          (privelet2D.privelet2D_engine(), self.X2, self.W2),
+                          (HB.HB_engine(), self.X1, self.W1),
+                          (dawa.greedyH_only_engine(), self.X1, self.W1),
+                          (dawa.dawa_engine(), self.X1, self.W1),
+                          (UG.UG_engine(), self.X2, self.W2)]:
+            batch = A.RunBatch(W, X.payload, self.expr_eps, seeds)
+            self.assertEqual(batch.shape, (len(seeds),) + X.payload.shape)
+            for (est, seed) in zip(batch, seeds):
+                self.assertTrue(np.array_equal(est, A.Run(W, X.payload, self.expr_eps, seed)))
+            self.assertRaises(AssertionError, A.RunBatch, W, X.payload, self.expr_eps, [self.expr_seed, None])
+
 #Third party algorithms
 
     def test_StructureFirst(self):
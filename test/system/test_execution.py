@@ -3,7 +3,10 @@ from dpcomp_core import dataset
 from dpcomp_core import metric
 from dpcomp_core import workload
 from dpcomp_core.algorithm import BaseAlgorithm
-from dpcomp_core.algorithm import uniform, AG
+from dpcomp_core.algorithm import identity, uniform, AG
+from dpcomp_core.execution import assemble_experiments
+from dpcomp_core.execution import ListWriter
+from dpcomp_core.execution import process_experiments
 from dpcomp_core import util
 from test import TestCommon
 import unittest
@@ -79,5 +82,25 @@ class TestExecution(TestCommon):
         self.assertDictEqual(E.analysis_payload()['ancillary_output'], 
                              ancillary_payload)
 
+    def test_parallel_matches_serial(self):
+        params_map = assemble_experiments({1: [identity.identity_engine(), uniform.uniform_noisy_engine()]},
+                                          {'HEPTH': 1},
+                                          {1: [workload.Prefix1D]},
+                                          {1: [256]},
+                                          [0.1, 1.0],
+                                          {1: [1e3]},
+                                          [10],
+                                          [0, 1],
+                                          [0])
+        serial = ListWriter()
+        process_experiments(params_map, serial)
+        parallel = ListWriter()
+        process_experiments(params_map, parallel, procs=2)
+
+        self.assertEqual(len(serial.metric_groups), len(parallel.metric_groups))
+        for g1, g2 in zip(serial.metric_groups, parallel.metric_groups):
+            self.assertEqual([m.hash for m in g1], [m.hash for m in g2])
+            self.assertEqual([m.error_payload for m in g1], [m.error_payload for m in g2])
+
 if __name__ == "__main__":
     unittest.main(verbosity=3)
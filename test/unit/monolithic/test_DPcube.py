@@ -0,0 +1,40 @@
+"""Unit test for DPcube.py and DPcube1D.py"""
+from __future__ import division
+
+from builtins import range
+import numpy
+from dpcomp_core.algorithm import DPcube
+from dpcomp_core.algorithm import DPcube1D
+import unittest
+
+class DPcubeTests(unittest.TestCase):
+
+
+    def setUp(self):
+        self.x = numpy.random.RandomState(0).poisson(5, (12, 9))
+
+    def testBucketcost(self):
+        p, pp = DPcube.DPcube_engine.bucketcost(self.x, 12, 9)
+        self.assertEqual(p[5, 7], self.x[:5, :7].sum())
+        self.assertEqual(pp[12, 9], (self.x**2).sum())
+
+        bucket = self.x[2:6, 3:9]
+        cost = DPcube.DPcube_engine.Compute(p, pp, 2, 3, 5, 8)
+        self.assertAlmostEqual(cost, ((bucket - bucket.mean())**2).sum())
+
+    def testSplit(self):
+        # the vectorized search picks the first best split, as a scan over positions would
+        epsilon = 0.05
+        p, pp = DPcube1D.DPcube1D_engine.bucketcost(self.x.ravel(), self.x.size)
+        Compute = DPcube1D.DPcube1D_engine.Compute
+        for (left, right) in [(0, 107), (10, 40), (7, 8), (3, 3)]:
+            cur, expected = Compute(p, pp, left, right) + 1/epsilon, None
+            for k in range(left, right):
+                cost = Compute(p, pp, left, k) + Compute(p, pp, k+1, right) + 2/epsilon
+                if cost < cur:
+                    cur, expected = cost, k
+            self.assertEqual(DPcube1D.DPcube1D_engine.split(epsilon, p, pp, left, right), expected)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,79 @@
+"""Unit test for HB.py and h_tree.py"""
+from __future__ import division
+
+from builtins import range
+import math
+import numpy
+from dpcomp_core.algorithm import HB
+from dpcomp_core.algorithm import HB2D
+from dpcomp_core.algorithm import h_tree
+from dpcomp_core import workload
+from dpcomp_core import dataset
+import unittest
+
+class HBTests(unittest.TestCase):
+
+
+    def setUp(self):
+        n = 1024
+        self.hist = numpy.array( list(range(n)))
+        self.d = dataset.Dataset(self.hist, None)
+
+        self.epsilon = 0.1
+        self.w1 = workload.Identity.oneD(1024 , weight=1.0)
+        self.eng = HB.HB_engine()
+
+    def testRandom(self):
+        seed = 1
+
+        h1 = self.eng.Run(self.w1,self.d.payload,self.epsilon,seed)
+        h2 = self.eng.Run(self.w1,self.d.payload,self.epsilon,seed)
+        self.assertSequenceEqual(list(h1),list(h2))
+
+    def testLevelTreeMatchesHTree(self):
+        prng = numpy.random.RandomState(0)
+        for (b, n) in [(2, 2), (2, 64), (3, 81), (16, 256)]:
+            leaves = prng.randint(0, 100, n)
+            htree = h_tree.HTree(b, leaves)
+            ltree = h_tree.LevelTree(b, leaves)
+            self.assertEqual(htree.height, ltree.height)
+
+            noise = prng.laplace(0, 10, ltree.size)
+            for (node, e) in zip(htree.postorder_iter(), noise):
+                node.noisy = node.count + e
+            noisy = [count + e for (count, e) in zip(ltree.counts, ltree.from_postorder(noise))]
+
+            htree_counts = [node.count for node in htree.postorder_iter()]
+            ltree_counts = numpy.empty(ltree.size)
+            for (count, idx) in zip(ltree.counts, ltree.postorder_index()):
+                ltree_counts[idx] = count
+            self.assertEqual(htree_counts, list(ltree_counts))
+            self.assertEqual(htree.inference(), list(ltree.inference(noisy)))
+
+    def testLevelTree2D(self):
+        x = numpy.arange(81.0).reshape((9, 9))
+        H = h_tree.LevelTree(3, x, ndim=2)
+        self.assertEqual([c.shape for c in H.counts], [(1, 1), (3, 3), (9, 9)])
+        self.assertEqual(H.counts[1][1, 2], x[3:6, 6:9].sum())
+        self.assertEqual(sorted(numpy.concatenate([i.ravel() for i in H.postorder_index()])), list(range(H.size)))
+
+        # consistent counts are left unchanged by postprocessing
+        counts = H.weighted_average(H.counts, [0.5] * H.height)
+        self.assertTrue(numpy.allclose(H.mean_consistency(counts), x))
+
+    def testBranchingSearch(self):
+        def brute_force(N, n, variance):
+            min_v, min_b = float('inf'), None
+            for b in range(2, n+1):
+                v = variance(N, b)
+                if v < min_v:
+                    min_v, min_b = v, b
+            return min_b
+
+        for N in list(range(2, 600)) + [3**8, 5**5, 4096, 65536]:
+            self.assertEqual(HB.find_best_branching(N), brute_force(N, N, HB.variance))
+            self.assertEqual(HB2D.find_best_branching(N), brute_force(N, int(math.sqrt(N)), HB2D.variance))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
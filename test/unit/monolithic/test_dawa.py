@@ -0,0 +1,92 @@
+"""Unit test for dawa/__init__.py"""
+from __future__ import division
+
+import numpy
+from dpcomp_core.algorithm import dawa
+from dpcomp_core.algorithm.dawa.partition_engines.partition_engine import Buckets
+from dpcomp_core.algorithm.dawa.routine_engines import routine_engine
+from dpcomp_core.algorithm.dawa.partition_engines import l1partition
+from dpcomp_core.algorithm.dawa.cutils import pycutil
+from dpcomp_core import workload
+import unittest
+
+class DawaTests(unittest.TestCase):
+
+
+    def testHilbertPosition(self):
+        xs, ys = dawa.hilbert(8)
+        self.assertTrue(dawa.hilbert(8)[0] is xs)   # memoized
+        position = dawa.hilbert_position(8)
+        self.assertEqual(list(position[xs, ys]), list(range(64)))
+        # consecutive cells are neighbours
+        self.assertTrue((abs(numpy.diff(xs)) + abs(numpy.diff(ys)) == 1).all())
+
+    def testHilbertWorkload(self):
+        d = 16
+        Q = workload.RandomRange(None, (12, 16), 100, 3)
+        xs, ys = dawa.hilbert(d)
+        lb, ub, wgt, qid = Q.range_arrays()
+        expected = workload.Workload.from_ranges(lb, ub, (d, d), wgt, qid).sparse_matrix[:, numpy.ravel_multi_index((xs, ys), (d, d))]
+        W = dawa.hilbert_workload(Q, d)
+        self.assertEqual(W.domain_shape, (d*d,))
+        self.assertEqual(abs(W.sparse_matrix - expected).max(), 0)
+
+        empty = workload.Workload.from_ranges(numpy.zeros((0, 2)), numpy.zeros((0, 2)), (d, d))
+        self.assertEqual(dawa.hilbert_workload(empty, d).size, 0)
+
+    def testBuckets(self):
+        pairs = [[0, 0], [1, 4], [5, 5], [6, 9]]
+        B = Buckets.from_pairs(pairs)
+        self.assertEqual(list(B), pairs)
+        self.assertEqual(B[-1], [6, 9])
+        self.assertEqual(len(B), 4)
+
+        x = numpy.arange(10)
+        counts = routine_engine.routine_engine._dataset_reform(x, B)
+        self.assertEqual(list(counts), [sum(x[lb:rb+1]) for lb, rb in pairs])
+        estx = routine_engine.routine_engine._rebuild(B, counts, 10)
+        self.assertEqual(list(estx), [0, 2.5, 2.5, 2.5, 2.5, 5, 7.5, 7.5, 7.5, 7.5])
+        self.assertRaises(AssertionError, Buckets, [1, 2], 10)
+
+    def testL1partitionBatch(self):
+        xs = numpy.random.RandomState(0).poisson(3, (4, 100))
+        epsilons = [0.1, 0.5, 1.0, 2.0]
+        seeds = [1, 2, 3, 4]
+        for (approx, single) in [(True, l1partition.L1partition_approx), (False, l1partition.L1partition)]:
+            for gethist in [True, False]:
+                batch = l1partition.L1partition_batch(xs, epsilons, 0.5, gethist, seeds, approx)
+                for (result, x, eps, seed) in zip(batch, xs, epsilons, seeds):
+                    expected = single(x, eps, 0.5, gethist, seed)
+                    self.assertEqual(numpy.asarray(list(result)).tolist(), numpy.asarray(list(expected)).tolist())
+
+    def testNumpyL1partition(self):
+        try:
+            from dpcomp_core.algorithm.dawa.cutils import cutil
+        except ImportError:
+            self.skipTest('C extension not built')
+        prng = numpy.random.RandomState(0)
+        for n in [1, 2, 7, 64, 300]:
+            x = (prng.zipf(1.3, n).clip(0, 5000) * prng.randint(0, 2, n)).astype(float)
+            for name in ['L1partition', 'L1partition_approx']:
+                for (epsilon, ratio) in [(0.01, 0.5), (1.0, 0.25)]:
+                    expected = getattr(cutil, name)(n+1, x, epsilon, ratio, n)
+                    result = getattr(pycutil, name)(n+1, x, epsilon, ratio, n)
+                    end = list(expected[1:]).index(0) + 2   # entries after the first 0 are not set
+                    self.assertEqual(list(result[:end]), list(expected[:end]))
+
+    def testL1partitionBatchLengths(self):
+        try:
+            from dpcomp_core.algorithm.dawa.cutils import cutil
+        except ImportError:
+            self.skipTest('C extension not built')
+        hist = numpy.zeros((3, 10), dtype=numpy.intc)
+        xs = numpy.ones((3, 10))
+        args = [xs, numpy.ones(3), numpy.ones(3) * 0.5, numpy.arange(3)]
+        cutil.L1partition_batch(hist, *(args + [1]))
+        for (k, short) in enumerate([xs[:2], numpy.ones(2), numpy.ones(2) * 0.5, numpy.arange(2)]):
+            bad = args[:k] + [short] + args[k+1:]
+            self.assertRaises(ValueError, cutil.L1partition_batch, hist, *(bad + [1]))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
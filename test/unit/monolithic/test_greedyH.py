@@ -0,0 +1,88 @@
+"""Unit test for greedyH.py"""
+from __future__ import division
+
+from builtins import range
+import numpy
+from dpcomp_core.algorithm import dawa
+from dpcomp_core.algorithm.dawa import greedyH
+from dpcomp_core.algorithm.dawa.routine_engines import routine_engine
+from dpcomp_core import workload
+import unittest
+
+class GreedyHTests(unittest.TestCase):
+
+
+    def setUp(self):
+        n = 256
+        self.x = numpy.array(list(range(n)))
+        Q = numpy.tril(numpy.ones((n, n)))   # prefix queries
+        self.QtQ = numpy.dot(Q.T, Q)
+        self.eng = greedyH.greedyH_engine()
+
+    def tearDown(self):
+        greedyH.greedyH_engine.reset_strategies()
+
+    def testStrategyCache(self):
+        h1 = self.eng.Run(self.QtQ, self.x, 0.1, 1)
+        h2 = self.eng.Run(self.QtQ, self.x, 0.5, 2)
+        stats = greedyH.greedyH_engine.strategy_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+        greedyH.greedyH_engine.reset_strategies()
+        self.assertTrue(numpy.array_equal(h1, self.eng.Run(self.QtQ, self.x, 0.1, 1)))
+        self.assertTrue(numpy.array_equal(h2, self.eng.Run(self.QtQ, self.x, 0.5, 2)))
+
+        # a different granularity picks a different strategy
+        greedyH.greedyH_engine(granu=50).Run(self.QtQ, self.x, 0.1, 1)
+        self.assertEqual(greedyH.greedyH_engine.strategy_stats()['misses'], 2)
+
+    def testStrategyCacheBounded(self):
+        # dawa's partitions are noisy, so every run has a new QtQ
+        budget = 100000
+        greedyH.greedyH_engine.reset_strategies(budget)
+        W = workload.Prefix1D(256)
+        x = numpy.random.RandomState(0).poisson(5, 256)
+        for seed in range(30):
+            dawa.dawa_engine().Run(W, x, 0.1, seed)
+        stats = greedyH.greedyH_engine.strategy_stats()
+        self.assertEqual(stats['misses'], 30)
+        self.assertTrue(stats['evictions'] > 0)
+        self.assertTrue(stats['bytes'] <= budget)
+        self.assertEqual(stats['entries'], 30 - stats['evictions'])
+
+    def testHierInverse(self):
+        inv, lbs, rbs, wgt, y = self.eng._Strategy(self.QtQ, self.x)
+        A = numpy.zeros((len(wgt), len(self.x)))
+        for (row, lb, rb, w) in zip(A, lbs, rbs, wgt):
+            row[lb:rb+1] = w
+        dense = inv.toarray()
+        self.assertTrue(numpy.allclose(numpy.dot(dense, numpy.dot(A.T, A)), numpy.eye(len(self.x))))
+
+        v = numpy.random.RandomState(0).rand(len(self.x), 3)
+        self.assertTrue(numpy.allclose(inv.dot(v), numpy.dot(dense, v)))
+        self.assertTrue(numpy.allclose(inv.colsum, dense.sum(axis=0)))
+        self.assertTrue(numpy.allclose(self.eng._Estimate(inv, lbs, rbs, wgt, y, len(self.x)), self.x))
+
+    def testRangeQtQ(self):
+        prng = numpy.random.RandomState(0)
+        n = 100
+        lb = prng.randint(0, n, 50)
+        ub = numpy.minimum(lb + prng.randint(0, 30, 50), n-1)
+        wgt = prng.rand(50)
+        partition = [[0, 0], [1, 9], [10, 10], [11, 40], [41, 99]]
+
+        W = workload.Workload.from_ranges(lb.reshape(-1, 1), ub.reshape(-1, 1), (n,), wgt)
+        Qmat = routine_engine.bucket_average(W.sparse_matrix, partition)
+        expected = Qmat.T.dot(Qmat).toarray()
+        self.assertTrue(numpy.allclose(routine_engine.range_qtq(lb, ub, wgt, partition), expected))
+
+        # unions of ranges
+        qid = numpy.arange(50) // 3
+        W = workload.Workload.from_ranges(lb.reshape(-1, 1), ub.reshape(-1, 1), (n,), wgt, qid)
+        Qmat = routine_engine.bucket_average(W.sparse_matrix, partition)
+        expected = Qmat.T.dot(Qmat).toarray()
+        self.assertTrue(numpy.allclose(routine_engine.range_qtq(lb, ub, wgt, partition, qid), expected))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,51 @@
+"""Unit test for mwemND.py"""
+from __future__ import division
+
+from builtins import range
+import numpy
+from dpcomp_core.algorithm import mwemND
+from dpcomp_core import workload
+import unittest
+
+class MwemTests(unittest.TestCase):
+
+
+    def setUp(self):
+        # a single box, a union of two overlapping boxes and a weighted box
+        lb = [(0, 0), (2, 3), (1, 1), (4, 0)]
+        ub = [(3, 5), (6, 6), (2, 4), (7, 7)]
+        self.Q = workload.Workload.from_ranges(lb, ub, (8, 8), wgt=[1.0, 1.0, 1.0, 0.5], qid=[0, 1, 1, 2])
+        self.x = numpy.random.RandomState(0).poisson(10, (8, 8))
+
+    def testMask(self):
+        for (i, q) in enumerate(self.Q.query_list):
+            mask = mwemND._Mask(self.Q, i)
+            self.assertAlmostEqual(mask.eval(self.x), q.eval(self.x))
+            self.assertEqual(mask.sens(), q.sens())
+
+    def testSweep(self):
+        # same as the dense update, one full-domain exp per query and round
+        hatx = numpy.empty(self.x.shape)
+        hatx.fill(self.x.mean())
+        estlist = [(i, q.eval(self.x) + 3 * i) for (i, q) in enumerate(self.Q.query_list)]
+
+        expected = hatx
+        for r in range(5):
+            for (i, est) in estlist:
+                q = self.Q.query_list[i]
+                total = expected.sum()
+                expected = expected * numpy.exp(q.asArray(self.x.shape) * (est - q.eval(expected)) / (2.0 * total))
+                expected *= total / expected.sum()
+
+        masks = [(mwemND._Mask(self.Q, i), est) for (i, est) in estlist]
+        result = mwemND.mwemND_simple_engine._sweep(hatx, masks, 5)
+        self.assertTrue(numpy.allclose(result, expected, rtol=1e-12))
+
+    def testRun(self):
+        hatx = mwemND.mwemND_engine(nrounds=2).Run(self.Q, self.x, 1.0, 0)
+        self.assertEqual(hatx.shape, self.x.shape)
+        self.assertAlmostEqual(hatx.sum(), self.x.sum())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -38,6 +38,40 @@ class PriveletTests(unittest.TestCase):
         h3 = self.eng.Run(self.w1,self.d.payload,self.epsilon,seed)
         self.assertSequenceEqual(list(h1),list(h3))
 
+    def testWaveRoundTrip(self):
+        x = numpy.random.RandomState(0).rand(4, 8, 2)
+        m = [2, 3, 1]
+        y = privelet.wave(x.copy(), m)
+        self.assertAlmostEqual(y[0, 0, 0], x.sum())
+        self.assertTrue(numpy.allclose(privelet.dewave(y, m), x))
+
+    def testBatch(self):
+        x = numpy.arange(40).reshape((5, 8))
+        batch = privelet.privelet(x, self.epsilon, numpy.random.RandomState(3), trials=4)
+        self.assertEqual(batch.shape, (4, 5, 8))
+
+        prng = numpy.random.RandomState(3)
+        for est in batch:
+            self.assertTrue(numpy.array_equal(est, privelet.privelet(x, self.epsilon, prng)))
+
+    def testND(self):
+        x = numpy.arange(60).reshape((3, 4, 5))
+        eng = privelet.priveletND_engine()
+        h1 = eng.Run(None, x, self.epsilon, 1)
+        self.assertEqual(h1.shape, x.shape)
+        self.assertTrue(numpy.array_equal(h1, eng.Run(None, x, self.epsilon, 1)))
+
+        h2 = eng.Run(self.w1, self.d.payload, self.epsilon, 1)
+        self.assertTrue(numpy.array_equal(h2, self.eng.Run(self.w1, self.d.payload, self.epsilon, 1)))
+
+    def testScratchReused(self):
+        h1 = self.eng.Run(self.w1, self.d.payload, self.epsilon, 1)
+        buf = self.eng._buf
+        h2 = self.eng.Run(self.w1, self.d.payload, self.epsilon, 1)
+        self.assertIs(self.eng._buf, buf)
+        self.assertTrue(numpy.array_equal(h1, h2))
+        self.assertNotIn('_buf', self.eng.asDict())
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)   
@@ -0,0 +1,128 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+from dpcomp_core.mixins import Cache
+from dpcomp_core.mixins import Cacheable
+from dpcomp_core.mixins import DiskCache
+
+
+class Counter(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return np.arange(10.0)
+
+
+class TestCache(unittest.TestCase):
+
+    def tearDown(self):
+        Cacheable.reset()
+
+    def test_lru_budget(self):
+        cache = Cache(budgets={'small': 2000})
+        for key in ['a', 'b']:
+            cache.set('small', key, np.zeros(100))
+        cache.get('small', 'a')   # a is now more recently used than b
+        cache.set('small', 'c', np.zeros(100))
+
+        self.assertFalse(cache.is_present('small', 'b'))
+        self.assertTrue(cache.is_present('small', 'a'))
+        self.assertTrue(cache.is_present('small', 'c'))
+
+        for key in range(10):   # labels without a budget are unbounded
+            cache.set('big', key, np.zeros(100))
+        self.assertEqual(cache.stats()['big']['entries'], 10)
+
+        stats = cache.stats()['small']
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['entries']), (2, 1, 1, 2))
+        self.assertTrue(1600 <= stats['bytes'] <= 2000)
+
+    def test_cache_stats(self):
+        Cacheable.set_cache(Cache())
+        obj = Counter()
+        for i in range(3):
+            Cacheable().maybe(obj, 'key', 'compute')
+
+        self.assertEqual(obj.calls, 1)
+        stats = Cacheable.cache_stats()['Counter']
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        Cacheable.reset()
+        shutil.rmtree(self.path)
+
+    def test_roundtrip(self):
+        cache = DiskCache(self.path)
+        self.assertFalse(cache.is_present('label', 'a'))
+
+        cache.set('label', 'a', np.ones((3,2)))
+        cache.set('label', 'b', {'x': 1, 'y': [2, 3]})
+        self.assertTrue(cache.is_present('label', 'a'))
+        self.assertFalse(cache.is_present('other', 'a'))
+
+        self.assertTrue(np.array_equal(cache.get('label', 'a'), np.ones((3,2))))
+        self.assertEqual(cache.get('label', 'b'), {'x': 1, 'y': [2, 3]})
+        self.assertFalse([f for f in os.listdir(self.path) if f.endswith('.tmp')])
+
+    def test_eviction(self):
+        cache = DiskCache(self.path, max_bytes=3000)
+        for (i, key) in enumerate(['a', 'b', 'c']):
+            cache.set('label', key, np.zeros(100))
+            os.utime(cache._find('label', key), (i, i))
+        cache.get('label', 'a')   # touch a, so b is least recently used
+        cache.set('label', 'd', np.zeros(100))
+
+        self.assertFalse(cache.is_present('label', 'b'))
+        for key in ['a', 'c', 'd']:
+            self.assertTrue(cache.is_present('label', key))
+        self.assertEqual(cache.stats()['label']['evictions'], 1)
+        self.assertEqual(cache.stats()['label']['entries'], 3)
+
+    def test_shared_between_instances(self):
+        Cacheable.set_cache(DiskCache(self.path))
+        obj = Counter()
+        first = Cacheable().maybe(obj, 'key', 'compute')
+
+        Cacheable.set_cache(DiskCache(self.path))   # e.g. a later run of the same sweep
+        second = Cacheable().maybe(obj, 'key', 'compute')
+
+        self.assertEqual(obj.calls, 1)
+        self.assertTrue(np.array_equal(first, second))
+
+    def test_evicted_between_check_and_get(self):
+        class RacingCache(DiskCache):
+            # another worker removes the entry right after it is found
+            def is_present(self, label, key):
+                present = DiskCache.is_present(self, label, key)
+                if present:
+                    os.remove(self._find(label, key))
+                return present
+
+        cache = RacingCache(self.path)
+        Cacheable.set_cache(cache)
+        obj = Counter()
+        Cacheable().maybe(obj, 'key', 'compute')
+        value = Cacheable().maybe(obj, 'key', 'compute')
+
+        self.assertEqual(obj.calls, 2)
+        self.assertTrue(np.array_equal(value, np.arange(10.0)))
+
+        # the file disappears after it is found
+        cache = DiskCache(self.path)
+        cache._find = lambda label, key: os.path.join(self.path, 'gone.npy')
+        self.assertRaises(KeyError, cache.get, 'Counter', 'key')
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -55,5 +55,33 @@ class TestUtil(unittest.TestCase):
 
         self.assertEqual(util.standardize(d2), util.standardize(serde(d2)))
 
+    def test_summed_area_table(self):
+        x = np.arange(60).reshape((3,4,5))
+        sat = util.summed_area_table(x)
+        self.assertEqual(sat.shape, (4,5,6))
+        self.assertEqual(sat[-1,-1,-1], x.sum())
+
+        lb = np.array([[0,0,0], [1,2,3], [2,3,4]])
+        ub = np.array([[2,3,4], [2,2,4], [2,3,4]])
+        expected = [x[l[0]:u[0]+1, l[1]:u[1]+1, l[2]:u[2]+1].sum() for l, u in zip(lb, ub)]
+        self.assertEqual(list(util.box_sums(sat, lb, ub)), expected)
+
+    def test_grid_counts(self):
+        x = np.arange(70).reshape((7,10))
+        rows, cols = util.grid_bounds(7, 3), util.grid_bounds(10, 4)
+        self.assertEqual(list(rows[0]), [0, 3, 6])
+        self.assertEqual(list(rows[1]), [2, 5, 6])
+
+        counts = util.grid_counts(util.summed_area_table(x), rows, cols)
+        expected = [[x[r0:r1+1, c0:c1+1].sum() for (c0, c1) in zip(*cols)] for (r0, r1) in zip(*rows)]
+        self.assertEqual(counts.tolist(), expected)
+
+        filled = util.fill_grid(counts, rows, cols)
+        self.assertEqual(filled.shape, x.shape)
+        self.assertEqual(filled[4, 9], x[3:6, 8:10].sum())
+
+        inner = util.grid_counts(util.summed_area_table(x), util.grid_bounds(3, 2), util.grid_bounds(4, 2), (3, 4))
+        self.assertEqual(inner[1, 1], x[5, 6:8].sum())
+
 def serde(item):
     return util.receive_from_json(json.loads(json.dumps(util.prepare_for_json(item))))